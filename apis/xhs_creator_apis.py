@@ -1,12 +1,28 @@
-import requests
 from xhs_utils.cookie_util import trans_cookies
-from xhs_utils.xhs_creator_util import get_common_headers, generate_xs, splice_str
+from xhs_utils.http_util import create_session
+from xhs_utils.signer import Creator_Python_Signer
+from xhs_utils.xhs_creator_util import get_common_headers, splice_str
 from xhs_utils.xhs_util import generate_x_b3_traceid
 
 
 class XHS_Creator_Apis():
-    def __init__(self):
-        self.base_url = "https://edith.xiaohongshu.com"
+    """
+        小红书创作者中心的api
+        :param signer: 签名后端，默认为纯python签名
+        :param base_url: api地址，可指向本地mock服务
+        :param session: 复用的requests.Session，不传则按下面的连接池参数创建
+        :param pool_maxsize: 每个host最多保持的连接数
+        :param pool_block: 为True时每个host的连接数严格不超过pool_maxsize
+        :param max_retries: 连接失败的重试次数
+        :param keep_alive: 是否保持长连接
+        :param timeout: 请求超时时间（秒）
+    """
+    def __init__(self, signer=None, base_url: str = "https://edith.xiaohongshu.com", session=None, pool_maxsize: int = 10,
+                 pool_block: bool = False, max_retries: int = 0, keep_alive: bool = True, timeout=None):
+        self.base_url = base_url
+        self.signer = signer or Creator_Python_Signer()
+        self.session = session or create_session(pool_maxsize=pool_maxsize, pool_block=pool_block, max_retries=max_retries, keep_alive=keep_alive)
+        self.timeout = timeout
 
 
     # page: 页数
@@ -26,9 +42,9 @@ class XHS_Creator_Apis():
             splice_api = splice_str(api, params)
             headers = get_common_headers()
             cookies = trans_cookies(cookies_str)
-            xs, xt, _ = generate_xs(cookies['a1'], splice_api, '')
+            xs, xt, _ = self.signer.sign(cookies['a1'], splice_api, '', 'GET')
             headers['x-s'], headers['x-t'] = xs, str(xt)
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, verify=False)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, verify=False, timeout=self.timeout)
             res_json = response.json()
             success = res_json["success"]
         except Exception as e:
@@ -1,18 +1,37 @@
 # encoding: utf-8
 import json
+import math
 import re
+import time
 import urllib
-import requests
-from xhs_utils.xhs_util import splice_str, generate_request_params, generate_x_b3_traceid, get_common_headers
+from concurrent.futures import ThreadPoolExecutor
+from xhs_utils.http_util import create_session
+from xhs_utils.xhs_util import splice_str, generate_request_params, generate_request_params_batch, generate_x_b3_traceid, get_common_headers, default_signer
 from loguru import logger
 
+# 静态方法访问网页端使用的共享连接池
+web_session = create_session()
+
 """
     获小红书的api
     :param cookies_str: 你的cookies
+    :param signer: 签名后端，默认为常驻node进程池，离线测试可传入 Fake_Signer
+    :param base_url: api地址，可指向本地mock服务
+    :param session: 复用的requests.Session，不传则按下面的连接池参数创建
+    :param pool_connections: 缓存连接池的host数量
+    :param pool_maxsize: 每个host最多保持的连接数
+    :param pool_block: 为True时每个host的连接数严格不超过pool_maxsize
+    :param max_retries: 连接失败的重试次数
+    :param keep_alive: 是否保持长连接
+    :param timeout: 请求超时时间（秒），可为 (连接超时, 读取超时)
 """
 class XHS_Apis():
-    def __init__(self):
-        self.base_url = "https://edith.xiaohongshu.com"
+    def __init__(self, signer=None, base_url: str = "https://edith.xiaohongshu.com", session=None, pool_connections: int = 10,
+                 pool_maxsize: int = 10, pool_block: bool = False, max_retries: int = 0, keep_alive: bool = True, timeout=None):
+        self.base_url = base_url
+        self.signer = signer or default_signer
+        self.session = session or create_session(pool_connections, pool_maxsize, pool_block, max_retries, keep_alive)
+        self.timeout = timeout
 
     def get_homefeed_all_channel(self, cookies_str: str, proxies: dict = None):
         """
@@ -22,8 +41,8 @@ class XHS_Apis():
         res_json = None
         try:
             api = "/api/sns/web/v1/homefeed/category"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -62,8 +81,8 @@ class XHS_Apis():
                 ],
                 "need_filter_image": False
             }
-            headers, cookies, trans_data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=trans_data, cookies=cookies, proxies=proxies)
+            headers, cookies, trans_data = generate_request_params(cookies_str, api, data, 'POST', self.signer)
+            response = self.session.post(self.base_url + api, headers=headers, data=trans_data, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -71,6 +90,30 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
+    def iter_homefeed_recommend_by_num(self, category, require_num, cookies_str: str, proxies: dict = None):
+        """
+            根据数量逐页获取主页推荐笔记的生成器，每获取一页就返回该页的笔记
+            下一页的请求体要用上一页返回的 cursor_score，只能逐页签名，不能像按页码分页的搜索那样批量签名
+            :param category: 你想要获取的频道
+            :param require_num: 你想要获取的笔记的数量
+            :param cookies_str: 你的cookies
+            获取失败时抛出异常
+        """
+        cursor_score, refresh_type, note_index = "", 1, 0
+        num = 0
+        while num < require_num:
+            success, msg, res_json = self.get_homefeed_recommend(category, cursor_score, refresh_type, note_index, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            if "items" not in res_json["data"]:
+                break
+            notes = res_json["data"]["items"][:require_num - num]
+            num += len(notes)
+            yield from notes
+            cursor_score = res_json["data"]["cursor_score"]
+            refresh_type = 3
+            note_index += 20
+
     def get_homefeed_recommend_by_num(self, category, require_num, cookies_str: str, proxies: dict = None):
         """
             根据数量获取主页推荐的笔记
@@ -79,27 +122,13 @@ class XHS_Apis():
             :param cookies_str: 你的cookies
             根据数量返回主页推荐的笔记
         """
-        cursor_score, refresh_type, note_index = "", 1, 0
         note_list = []
         try:
-            while True:
-                success, msg, res_json = self.get_homefeed_recommend(category, cursor_score, refresh_type, note_index, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                cursor_score = res_json["data"]["cursor_score"]
-                refresh_type = 3
-                note_index += 20
-                if len(note_list) > require_num:
-                    break
+            note_list.extend(self.iter_homefeed_recommend_by_num(category, require_num, cookies_str, proxies))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
         return success, msg, note_list
 
     def get_user_info(self, user_id: str, cookies_str: str, proxies: dict = None):
@@ -116,8 +145,8 @@ class XHS_Apis():
                 "target_user_id": user_id
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -134,8 +163,8 @@ class XHS_Apis():
         res_json = None
         try:
             api = f"/api/sns/web/v1/user/selfinfo"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -153,8 +182,8 @@ class XHS_Apis():
         res_json = None
         try:
             api = f"/api/sns/web/v2/user/me"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -182,8 +211,8 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -192,6 +221,33 @@ class XHS_Apis():
         return success, msg, res_json
 
 
+    def iter_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None):
+        """
+           逐页获取用户所有笔记的生成器，每获取一页就返回该页的笔记
+           :param user_url: 你想要获取的用户的url
+           :param cookies_str: 你的cookies
+           获取失败时抛出异常
+        """
+        cursor = ''
+        urlParse = urllib.parse.urlparse(user_url)
+        user_id = urlParse.path.split("/")[-1]
+        kvs = urlParse.query.split('&')
+        kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
+        xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
+        xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search"
+        while True:
+            success, msg, res_json = self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies)
+            if not success:
+                raise Exception(msg)
+            notes = res_json["data"]["notes"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            yield from notes
+            if len(notes) == 0 or not res_json["data"]["has_more"]:
+                break
+
     def get_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None):
         """
            获取用户所有笔记
@@ -199,27 +255,10 @@ class XHS_Apis():
            :param cookies_str: 你的cookies
            返回用户的所有笔记
         """
-        cursor = ''
         note_list = []
         try:
-            urlParse = urllib.parse.urlparse(user_url)
-            user_id = urlParse.path.split("/")[-1]
-            kvs = urlParse.query.split('&')
-            kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
-            xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
-            xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search"
-            while True:
-                success, msg, res_json = self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies)
-                if not success:
-                    raise Exception(msg)
-                notes = res_json["data"]["notes"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_list.extend(notes)
-                if len(notes) == 0 or not res_json["data"]["has_more"]:
-                    break
+            note_list.extend(self.iter_user_all_notes(user_url, cookies_str, proxies))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
@@ -245,8 +284,8 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -308,8 +347,8 @@ class XHS_Apis():
                 "xsec_source": xsec_source,
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -379,8 +418,8 @@ class XHS_Apis():
                 "xsec_source": kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search",
                 "xsec_token": kvDist['xsec_token']
             }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST', self.signer)
+            response = self.session.post(self.base_url + api, headers=headers, data=data, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -403,8 +442,8 @@ class XHS_Apis():
                 "keyword": urllib.parse.quote(word)
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -412,20 +451,94 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def search_note(self, query: str, cookies_str: str, page=1, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+    def post_batch(self, api: str, datas: list, cookies_str: str, proxies: dict = None, executor=None):
         """
-            获取搜索笔记的结果
-            :param query 搜索的关键词
-            :param cookies_str 你的cookies
-            :param page 搜索的页数
-            :param sort_type_choice 排序方式 0 综合排序, 1 最新, 2 最多点赞, 3 最多评论, 4 最多收藏
-            :param note_type 笔记类型 0 不限, 1 视频笔记, 2 普通笔记
-            :param note_time 笔记时间 0 不限, 1 一天内, 2 一周内天, 3 半年内
-            :param note_range 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
-            :param pos_distance 位置距离 0 不限, 1 同城, 2 附近 指定这个必须要指定 geo
-            返回搜索的结果
+            批量请求同一个POST接口，先在一次签名往返里签好全部请求，再并发发送
+            :param api: 请求的api
+            :param datas: 每个请求的请求体
+            :param executor: 发送请求的线程池，为空时依次发送
+            返回 [(success, msg, res_json), ...]，与datas顺序一致
+        """
+        try:
+            params = generate_request_params_batch(cookies_str, [(api, data, 'POST') for data in datas], self.signer)
+        except Exception as e:
+            return [(False, str(e), None)] * len(datas)
+
+        def send(param):
+            res_json = None
+            try:
+                headers, cookies, data = param
+                response = self.session.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies, timeout=self.timeout)
+                res_json = response.json()
+                success, msg = res_json["success"], res_json["msg"]
+            except Exception as e:
+                success = False
+                msg = str(e)
+            return success, msg, res_json
+
+        if executor is None:
+            return [send(param) for param in params]
+        return list(executor.map(send, params))
+
+    @staticmethod
+    def iter_some_page_items(fetch_pages, items_key: str, require_num: int, page_size: int, window: int):
+        """
+            按页码分页的接口按窗口获取多页的生成器，一次获取 window 页，按页码顺序返回结果
+            :param fetch_pages: 获取一个窗口的函数 fetch_pages(pages) -> [(success, msg, res_json), ...]，可以一次签名全部页再并发请求
+            :param items_key: 结果列表在 res_json["data"] 中的字段名
+            :param require_num: 需要的数量，据此估算还需要的页数
+            :param page_size: 每页的数量
+            :param window: 每个窗口最多的页数
+            遇到 has_more 为 false 的页即停止，按id去重，获取失败时抛出异常
+        """
+        if require_num <= 0:
+            return
+        page = 1
+        num = 0
+        seen_ids = set()
+        while True:
+            need_pages = math.ceil((require_num - num) / page_size)
+            pages = range(page, page + min(window, max(need_pages, 1)))
+            page += len(pages)
+            for success, msg, res_json in fetch_pages(pages):
+                if not success:
+                    raise Exception(msg)
+                if items_key not in res_json["data"]:
+                    return
+                for item in res_json["data"][items_key]:
+                    item_id = item.get('id')
+                    if item_id is not None:
+                        if item_id in seen_ids:
+                            continue
+                        seen_ids.add(item_id)
+                    yield item
+                    num += 1
+                    if num >= require_num:
+                        return
+                if not res_json["data"]["has_more"]:
+                    return
+
+    @staticmethod
+    def get_some_page_items(fetch_pages, items_key: str, require_num: int, page_size: int, window: int):
+        """
+            按页码分页的接口按窗口获取多页，参数见 iter_some_page_items
+            返回 (success, msg, item_list)
+        """
+        item_list = []
+        try:
+            item_list.extend(XHS_Apis.iter_some_page_items(fetch_pages, items_key, require_num, page_size, window))
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, item_list
+
+    @staticmethod
+    def get_search_note_data(query: str, page=1, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo=""):
+        """
+            构造搜索笔记的请求体，参数含义见 search_note
+            返回请求体
         """
-        res_json = None
         sort_type = "general"
         if sort_type_choice == 1:
             sort_type = "time_descending"
@@ -461,57 +574,74 @@ class XHS_Apis():
             filter_pos_distance = "附近"
         if geo:
             geo = json.dumps(geo, separators=(',', ':'))
+        data = {
+            "keyword": query,
+            "page": page,
+            "page_size": 20,
+            "search_id": generate_x_b3_traceid(21),
+            "sort": "general",
+            "note_type": 0,
+            "ext_flags": [],
+            "filters": [
+                {
+                    "tags": [
+                        sort_type
+                    ],
+                    "type": "sort_type"
+                },
+                {
+                    "tags": [
+                        filter_note_type
+                    ],
+                    "type": "filter_note_type"
+                },
+                {
+                    "tags": [
+                        filter_note_time
+                    ],
+                    "type": "filter_note_time"
+                },
+                {
+                    "tags": [
+                        filter_note_range
+                    ],
+                    "type": "filter_note_range"
+                },
+                {
+                    "tags": [
+                        filter_pos_distance
+                    ],
+                    "type": "filter_pos_distance"
+                }
+            ],
+            "geo": geo,
+            "image_formats": [
+                "jpg",
+                "webp",
+                "avif"
+            ]
+        }
+        return data
+
+    def search_note(self, query: str, cookies_str: str, page=1, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            获取搜索笔记的结果
+            :param query 搜索的关键词
+            :param cookies_str 你的cookies
+            :param page 搜索的页数
+            :param sort_type_choice 排序方式 0 综合排序, 1 最新, 2 最多点赞, 3 最多评论, 4 最多收藏
+            :param note_type 笔记类型 0 不限, 1 视频笔记, 2 普通笔记
+            :param note_time 笔记时间 0 不限, 1 一天内, 2 一周内天, 3 半年内
+            :param note_range 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
+            :param pos_distance 位置距离 0 不限, 1 同城, 2 附近 指定这个必须要指定 geo
+            返回搜索的结果
+        """
+        res_json = None
         try:
             api = "/api/sns/web/v1/search/notes"
-            data = {
-                "keyword": query,
-                "page": page,
-                "page_size": 20,
-                "search_id": generate_x_b3_traceid(21),
-                "sort": "general",
-                "note_type": 0,
-                "ext_flags": [],
-                "filters": [
-                    {
-                        "tags": [
-                            sort_type
-                        ],
-                        "type": "sort_type"
-                    },
-                    {
-                        "tags": [
-                            filter_note_type
-                        ],
-                        "type": "filter_note_type"
-                    },
-                    {
-                        "tags": [
-                            filter_note_time
-                        ],
-                        "type": "filter_note_time"
-                    },
-                    {
-                        "tags": [
-                            filter_note_range
-                        ],
-                        "type": "filter_note_range"
-                    },
-                    {
-                        "tags": [
-                            filter_pos_distance
-                        ],
-                        "type": "filter_pos_distance"
-                    }
-                ],
-                "geo": geo,
-                "image_formats": [
-                    "jpg",
-                    "webp",
-                    "avif"
-                ]
-            }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
+            data = self.get_search_note_data(query, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo)
+            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST', self.signer)
+            response = self.session.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -519,7 +649,33 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+    def iter_search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None, window=1):
+        """
+            指定数量逐页搜索笔记的生成器，每获取一页就返回该页的笔记，参数见 search_some_note
+            获取失败时抛出异常
+        """
+        fetch_page = lambda page: self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
+        if window > 1:
+            with ThreadPoolExecutor(max_workers=window) as executor:
+                fetch_pages = lambda pages: self.post_batch("/api/sns/web/v1/search/notes", [self.get_search_note_data(query, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo) for page in pages], cookies_str, proxies, executor)
+                yield from self.iter_some_page_items(fetch_pages, "items", require_num, 20, window)
+            return
+        page = 1
+        num = 0
+        while num < require_num:
+            success, msg, res_json = fetch_page(page)
+            if not success:
+                raise Exception(msg)
+            if "items" not in res_json["data"]:
+                break
+            notes = res_json["data"]["items"][:require_num - num]
+            num += len(notes)
+            yield from notes
+            page += 1
+            if not res_json["data"]["has_more"]:
+                break
+
+    def search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None, window=1):
         """
             指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
             :param query 搜索的关键词
@@ -531,29 +687,35 @@ class XHS_Apis():
             :param note_range 笔记范围 0 不限, 1 已看过, 2 未看过, 3 已关注
             :param pos_distance 位置距离 0 不限, 1 同城, 2 附近 指定这个必须要指定 geo
             :param geo: 定位信息 经纬度
+            :param window: 同时获取的页数，大于1时按 require_num 估算页数，一次签名后并发获取，结果按id去重
             返回搜索的结果
         """
-        page = 1
         note_list = []
         try:
-            while True:
-                success, msg, res_json = self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
-                if not success:
-                    raise Exception(msg)
-                if "items" not in res_json["data"]:
-                    break
-                notes = res_json["data"]["items"]
-                note_list.extend(notes)
-                page += 1
-                if len(note_list) >= require_num or not res_json["data"]["has_more"]:
-                    break
+            note_list.extend(self.iter_search_some_note(query, require_num, cookies_str, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies, window))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
-        if len(note_list) > require_num:
-            note_list = note_list[:require_num]
         return success, msg, note_list
 
+    @staticmethod
+    def get_search_user_data(query: str, page=1):
+        """
+            构造搜索用户的请求体
+            返回请求体
+        """
+        return {
+            "search_user_request": {
+                "keyword": query,
+                "search_id": "2dn9they1jbjxwawlo4xd",
+                "page": page,
+                "page_size": 15,
+                "biz_type": "web_search_user",
+                "request_id": "22471139-1723999898524"
+            }
+        }
+
     def search_user(self, query: str, cookies_str: str, page=1, proxies: dict = None):
         """
             获取搜索用户的结果
@@ -565,18 +727,9 @@ class XHS_Apis():
         res_json = None
         try:
             api = "/api/sns/web/v1/search/usersearch"
-            data = {
-                "search_user_request": {
-                    "keyword": query,
-                    "search_id": "2dn9they1jbjxwawlo4xd",
-                    "page": page,
-                    "page_size": 15,
-                    "biz_type": "web_search_user",
-                    "request_id": "22471139-1723999898524"
-                }
-            }
-            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST')
-            response = requests.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies)
+            data = self.get_search_user_data(query, page)
+            headers, cookies, data = generate_request_params(cookies_str, api, data, 'POST', self.signer)
+            response = self.session.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -584,14 +737,19 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def search_some_user(self, query: str, require_num: int, cookies_str: str, proxies: dict = None):
+    def search_some_user(self, query: str, require_num: int, cookies_str: str, proxies: dict = None, window=1):
         """
             指定数量搜索用户
             :param query 搜索的关键词
             :param require_num 搜索的数量
             :param cookies_str 你的cookies
+            :param window: 同时获取的页数，大于1时按 require_num 估算页数，一次签名后并发获取，结果按id去重
             返回搜索的结果
         """
+        if window > 1:
+            with ThreadPoolExecutor(max_workers=window) as executor:
+                fetch_pages = lambda pages: self.post_batch("/api/sns/web/v1/search/usersearch", [self.get_search_user_data(query, page) for page in pages], cookies_str, proxies, executor)
+                return self.get_some_page_items(fetch_pages, "users", require_num, 15, window)
         page = 1
         user_list = []
         try:
@@ -632,8 +790,8 @@ class XHS_Apis():
                 "xsec_token": xsec_token
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -641,6 +799,29 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
+    def iter_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            逐页获取笔记全部一级评论的生成器，每获取一页就返回该页的评论
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            获取失败时抛出异常
+        """
+        cursor = ''
+        num = 0
+        while True:
+            success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            comments = res_json["data"]["comments"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            num += len(comments)
+            yield from comments
+            if num == 0 or not res_json["data"]["has_more"]:
+                break
+
     def get_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
         """
             获取笔记的全部一级评论
@@ -648,21 +829,60 @@ class XHS_Apis():
             :param cookies_str 你的cookies
             返回笔记的全部一级评论
         """
+        note_out_comment_list = []
+        try:
+            note_out_comment_list.extend(self.iter_note_all_out_comment(note_id, xsec_token, cookies_str, proxies))
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, note_out_comment_list
+
+    def iter_note_new_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, watermark: dict = None, proxies: dict = None):
+        """
+            逐页获取水位线之后的新一级评论的生成器，评论按时间倒序返回，翻到水位线就停止
+            和水位线同一时间的评论在遇到水位线那条评论之前都算新评论
+            置顶等不按时间排序的旧评论会被跳过，直到某一页全是更早的评论或者遇到水位线那条评论才停止翻页
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            :param watermark 上次同步的水位线 {'time': create_time, 'id': 评论id}，为空时获取全部
+            获取失败时抛出异常
+        """
         cursor = ''
+        reached = False
+        while True:
+            success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            comments = res_json["data"]["comments"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            for comment in comments:
+                if watermark is None:
+                    yield comment
+                elif comment['id'] == watermark['id']:
+                    reached = True
+                elif int(comment['create_time']) > watermark['time'] or (int(comment['create_time']) == watermark['time'] and not reached):
+                    yield comment
+            if not comments or not res_json["data"]["has_more"]:
+                break
+            if watermark is not None and (reached or all(int(comment['create_time']) < watermark['time'] for comment in comments)):
+                break
+
+    def get_note_new_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, watermark: dict = None, proxies: dict = None):
+        """
+            获取水位线之后的新一级评论
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            :param watermark 上次同步的水位线 {'time': create_time, 'id': 评论id}，为空时获取全部
+            返回新的一级评论
+        """
         note_out_comment_list = []
         try:
-            while True:
-                success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                comments = res_json["data"]["comments"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                note_out_comment_list.extend(comments)
-                if len(note_out_comment_list) == 0 or not res_json["data"]["has_more"]:
-                    break
+            note_out_comment_list.extend(self.iter_note_new_out_comment(note_id, xsec_token, cookies_str, watermark, proxies))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
@@ -689,8 +909,8 @@ class XHS_Apis():
                 "xsec_token": xsec_token
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -698,19 +918,56 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None):
+    @staticmethod
+    def take_budget(items: list, taken: int, max_num: int, has_more: bool):
+        """
+            按预算截取一页结果，一级评论和二级评论共用
+            :param items: 这一页的结果
+            :param taken: 之前已经保留的数量
+            :param max_num: 最多保留的数量，为空不限制
+            :param has_more: 这一页之后是否还有更多
+            返回 (保留的结果, 预算是否用完, 是否因预算丢弃了结果)，刚好用完且没有更多时不算丢弃
+        """
+        if max_num is None or taken + len(items) < max_num:
+            return items, False, False
+        left = max(max_num - taken, 0)
+        return items[:left], True, len(items) > left or has_more
+
+    @staticmethod
+    def plan_inner_comment(comment: dict, max_inner_comment: int, expand_inner: bool):
+        """
+            按二级评论预算裁剪一级评论自带的二级评论，并判断是否还要翻页获取
+            返回 (是否翻页获取, 最多再获取的二级评论数, 是否因预算没有取全)
+        """
+        truncated = False
+        if max_inner_comment is not None and len(comment['sub_comments']) > max_inner_comment:
+            del comment['sub_comments'][max_inner_comment:]
+            truncated = True
+        if not comment['sub_comment_has_more']:
+            return False, None, truncated
+        if not expand_inner or (max_inner_comment is not None and len(comment['sub_comments']) >= max_inner_comment):
+            return False, None, True
+        return True, max_inner_comment - len(comment['sub_comments']) if max_inner_comment is not None else None, truncated
+
+    def get_note_some_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, max_num: int = None, deadline: float = None):
         """
-            获取笔记的全部二级评论
+            按预算获取笔记的二级评论，获取到的评论追加到 comment['sub_comments']
             :param comment 笔记的一级评论
             :param cookies_str 你的cookies
-            返回笔记的全部二级评论
+            :param max_num 最多再获取的二级评论数，为空不限制
+            :param deadline time.monotonic() 的截止时间，到时不再发起新的请求，为空不限制
+            返回是否因预算用完而没有取全
         """
+        truncated = False
         try:
             if not comment['sub_comment_has_more']:
-                return True, 'success', comment
+                return True, 'success', truncated
             cursor = comment['sub_comment_cursor']
             inner_comment_list = []
             while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    truncated = True
+                    break
                 success, msg, res_json = self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies)
                 if not success:
                     raise Exception(msg)
@@ -719,39 +976,113 @@ class XHS_Apis():
                     cursor = str(res_json["data"]["cursor"])
                 else:
                     break
+                comments, used_up, cut = self.take_budget(comments, len(inner_comment_list), max_num, res_json["data"]["has_more"])
                 inner_comment_list.extend(comments)
+                if used_up:
+                    truncated = cut
+                    break
                 if not res_json["data"]["has_more"]:
                     break
             comment['sub_comments'].extend(inner_comment_list)
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
+        return success, msg, truncated
+
+    def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的全部二级评论
+            :param comment 笔记的一级评论
+            :param cookies_str 你的cookies
+            返回笔记的全部二级评论
+        """
+        success, msg, truncated = self.get_note_some_inner_comment(comment, xsec_token, cookies_str, proxies)
         return success, msg, comment
 
-    def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None):
+    def get_note_some_comment(self, url: str, cookies_str: str, proxies: dict = None, max_out_comment: int = None, max_inner_comment: int = None, expand_inner: bool = True, time_limit: float = None, max_workers: int = 1):
         """
-            获取一篇文章的所有评论
-            :param note_id: 你想要获取的笔记的id
+            按预算获取一篇文章的评论，任一预算用完就停止翻页
+            :param url: 你想要获取的笔记的url
             :param cookies_str: 你的cookies
-            返回一篇文章的所有评论
+            :param max_out_comment: 最多获取的一级评论数，为空不限制
+            :param max_inner_comment: 每条一级评论最多保留的二级评论数（含一级评论自带的），为空不限制
+            :param expand_inner: 是否翻页获取二级评论，为False时只保留一级评论自带的二级评论
+            :param time_limit: 最多耗时的秒数，到时不再发起新的请求，已发出的请求仍会等待返回，为空不限制
+            :param max_workers: 同时获取二级评论的线程数，大于1时一级评论边翻页边并发展开二级评论
+            返回 {'comments': 评论列表, 'truncated': 是否因预算没有取全}
         """
         out_comment_list = []
+        truncated = False
         try:
             urlParse = urllib.parse.urlparse(url)
             note_id = urlParse.path.split("/")[-1]
             kvs = urlParse.query.split('&')
             kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
-            success, msg, out_comment_list = self.get_note_all_out_comment(note_id, kvDist['xsec_token'], cookies_str, proxies)
-            if not success:
-                raise Exception(msg)
-            for comment in out_comment_list:
-                success, msg, new_comment = self.get_note_all_inner_comment(comment, kvDist['xsec_token'], cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
+            xsec_token = kvDist['xsec_token']
+            deadline = time.monotonic() + time_limit if time_limit is not None else None
+            with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+                futures = []
+                try:
+                    cursor = ''
+                    while True:
+                        if deadline is not None and time.monotonic() >= deadline:
+                            truncated = True
+                            break
+                        success, msg, res_json = self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+                        if not success:
+                            raise Exception(msg)
+                        comments = res_json["data"]["comments"]
+                        if 'cursor' in res_json["data"]:
+                            cursor = str(res_json["data"]["cursor"])
+                        else:
+                            break
+                        has_more = res_json["data"]["has_more"]
+                        comments, used_up, cut = self.take_budget(comments, len(out_comment_list), max_out_comment, has_more)
+                        if used_up:
+                            truncated = truncated or cut
+                            has_more = False
+                        for comment in comments:
+                            out_comment_list.append(comment)
+                            need_expand, max_num, cut = self.plan_inner_comment(comment, max_inner_comment, expand_inner)
+                            truncated = truncated or cut
+                            if not need_expand:
+                                continue
+                            if max_workers <= 1:
+                                success, msg, inner_truncated = self.get_note_some_inner_comment(comment, xsec_token, cookies_str, proxies, max_num, deadline)
+                                if not success:
+                                    raise Exception(msg)
+                                truncated = truncated or inner_truncated
+                            else:
+                                # 每拿到一条一级评论就提交它的二级评论任务，不等后面的一级评论翻页结束
+                                futures.append(executor.submit(self.get_note_some_inner_comment, comment, xsec_token, cookies_str, proxies, max_num, deadline))
+                        if len(out_comment_list) == 0 or not has_more:
+                            break
+                    for future in futures:
+                        success, msg, inner_truncated = future.result()
+                        if not success:
+                            raise Exception(msg)
+                        truncated = truncated or inner_truncated
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
-        return success, msg, out_comment_list
+        return success, msg, {'comments': out_comment_list, 'truncated': truncated}
+
+    def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None, max_workers: int = 1):
+        """
+            获取一篇文章的所有评论
+            :param url: 你想要获取的笔记的url
+            :param cookies_str: 你的cookies
+            :param max_workers: 同时获取二级评论的线程数，大于1时一级评论边翻页边并发展开二级评论
+            返回一篇文章的所有评论
+        """
+        success, msg, res = self.get_note_some_comment(url, cookies_str, proxies, max_workers=max_workers)
+        return success, msg, res['comments']
 
     def get_unread_message(self, cookies_str: str, proxies: dict = None):
         """
@@ -762,8 +1093,8 @@ class XHS_Apis():
         res_json = None
         try:
             api = "/api/sns/web/unread_count"
-            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET')
-            response = requests.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -771,6 +1102,32 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
+    @staticmethod
+    def iter_message_list(get_page, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            按cursor逐页获取消息的生成器，评论和@提醒、赞和收藏、新增关注共用
+            :param get_page: 获取某一页消息的函数 get_page(cursor, cookies_str, proxies) -> (success, msg, res_json)
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线 {'time': 消息时间, 'id': 消息id}，消息按时间倒序，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            获取失败时抛出异常
+        """
+        cursor = ''
+        while True:
+            success, msg, res_json = get_page(cursor, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            messages = res_json["data"]["message_list"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            for message in messages:
+                if watermark is not None and (message['id'] == watermark['id'] or int(message['time']) < watermark['time']):
+                    return
+                yield message
+            if not res_json["data"]["has_more"]:
+                break
+
     def get_metions(self, cursor: str, cookies_str: str, proxies: dict = None):
         """
             获取评论和@提醒
@@ -786,8 +1143,8 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -795,27 +1152,26 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def get_all_metions(self, cookies_str: str, proxies: dict = None):
+    def iter_all_metions(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部评论和@提醒的生成器，每获取一页就返回该页的消息
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            获取失败时抛出异常
+        """
+        yield from self.iter_message_list(self.get_metions, cookies_str, proxies, watermark)
+
+    def get_all_metions(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
         """
             获取全部的评论和@提醒
             :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
             返回全部的评论和@提醒
         """
-        cursor = ''
         metions_list = []
         try:
-            while True:
-                success, msg, res_json = self.get_metions(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                metions = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                metions_list.extend(metions)
-                if not res_json["data"]["has_more"]:
-                    break
+            metions_list.extend(self.iter_all_metions(cookies_str, proxies, watermark))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
@@ -836,8 +1192,8 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -845,27 +1201,26 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def get_all_likesAndcollects(self, cookies_str: str, proxies: dict = None):
+    def iter_all_likesAndcollects(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部赞和收藏的生成器，每获取一页就返回该页的消息
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            获取失败时抛出异常
+        """
+        yield from self.iter_message_list(self.get_likesAndcollects, cookies_str, proxies, watermark)
+
+    def get_all_likesAndcollects(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
         """
             获取全部的赞和收藏
             :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
             返回全部的赞和收藏
         """
-        cursor = ''
         likesAndcollects_list = []
         try:
-            while True:
-                success, msg, res_json = self.get_likesAndcollects(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                likesAndcollects = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                likesAndcollects_list.extend(likesAndcollects)
-                if not res_json["data"]["has_more"]:
-                    break
+            likesAndcollects_list.extend(self.iter_all_likesAndcollects(cookies_str, proxies, watermark))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
@@ -886,8 +1241,8 @@ class XHS_Apis():
                 "cursor": cursor
             }
             splice_api = splice_str(api, params)
-            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET')
-            response = requests.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies)
+            headers, cookies, data = generate_request_params(cookies_str, splice_api, '', 'GET', self.signer)
+            response = self.session.get(self.base_url + splice_api, headers=headers, cookies=cookies, proxies=proxies, timeout=self.timeout)
             res_json = response.json()
             success, msg = res_json["success"], res_json["msg"]
         except Exception as e:
@@ -895,27 +1250,26 @@ class XHS_Apis():
             msg = str(e)
         return success, msg, res_json
 
-    def get_all_new_connections(self, cookies_str: str, proxies: dict = None):
+    def iter_all_new_connections(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部新增关注的生成器，每获取一页就返回该页的消息
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            获取失败时抛出异常
+        """
+        yield from self.iter_message_list(self.get_new_connections, cookies_str, proxies, watermark)
+
+    def get_all_new_connections(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
         """
             获取全部的新增关注
             :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
             返回全部的新增关注
         """
-        cursor = ''
         connections_list = []
         try:
-            while True:
-                success, msg, res_json = self.get_new_connections(cursor, cookies_str, proxies)
-                if not success:
-                    raise Exception(msg)
-                connections = res_json["data"]["message_list"]
-                if 'cursor' in res_json["data"]:
-                    cursor = str(res_json["data"]["cursor"])
-                else:
-                    break
-                connections_list.extend(connections)
-                if not res_json["data"]["has_more"]:
-                    break
+            connections_list.extend(self.iter_all_new_connections(cookies_str, proxies, watermark))
+            success, msg = True, '成功'
         except Exception as e:
             success = False
             msg = str(e)
@@ -934,7 +1288,7 @@ class XHS_Apis():
         try:
             headers = get_common_headers()
             url = f"https://www.xiaohongshu.com/explore/{note_id}"
-            response = requests.get(url, headers=headers)
+            response = web_session.get(url, headers=headers)
             res = response.text
             video_addr = re.findall(r'<meta name="og:video" content="(.*?)">', res)[0]
         except Exception as e:
@@ -0,0 +1,582 @@
+# encoding: utf-8
+import asyncio
+import time
+import urllib
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+
+from apis.xhs_pc_apis import XHS_Apis
+from xhs_utils.xhs_util import splice_str, generate_request_params, default_signer
+
+"""
+    基于asyncio的小红书api，接口与 XHS_Apis 一致，返回 (success, msg, res_json)
+    签名在线程池中完成，不阻塞事件循环
+    :param signer: 签名后端，默认为常驻node进程池
+    :param base_url: api地址，可指向本地mock服务
+    :param limit: 同时打开的最大连接数
+    :param limit_per_host: 每个host同时打开的最大连接数
+    :param keepalive_timeout: 空闲连接保持时间（秒）
+    :param timeout: 请求超时时间（秒）
+    :param sign_workers: 签名线程数
+"""
+class AsyncXHS_Apis():
+    def __init__(self, signer=None, base_url: str = "https://edith.xiaohongshu.com", limit: int = 100, limit_per_host: int = 100,
+                 keepalive_timeout: float = 30, timeout: float = None, sign_workers: int = 4):
+        self.base_url = base_url
+        self.signer = signer or default_signer
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.sign_executor = ThreadPoolExecutor(max_workers=sign_workers)
+        self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+        self.sign_executor.shutdown(wait=False)
+
+    def get_session(self):
+        # aiohttp的session必须在事件循环中创建，第一次请求时才创建
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host, keepalive_timeout=self.keepalive_timeout)
+            # cookies由每次请求传入，不保存服务端返回的cookie
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout, cookie_jar=aiohttp.DummyCookieJar())
+        return self.session
+
+    async def request(self, method: str, api: str, cookies_str: str, data='', proxies: dict = None):
+        """
+            签名并发送请求
+            :param method: GET 或 POST
+            :param api: 请求的api（GET请求含query参数）
+            :param data: POST请求体
+            返回 res_json
+        """
+        loop = asyncio.get_running_loop()
+        headers, cookies, data = await loop.run_in_executor(self.sign_executor, generate_request_params, cookies_str, api, data, method, self.signer)
+        headers['cookie'] = '; '.join(f'{k}={v}' for k, v in cookies.items())
+        proxy = None
+        if proxies:
+            proxy = proxies.get('https') or proxies.get('http')
+        session = self.get_session()
+        if method == 'GET':
+            request = session.get(self.base_url + api, headers=headers, proxy=proxy)
+        else:
+            request = session.post(self.base_url + api, headers=headers, data=data.encode('utf-8'), proxy=proxy)
+        async with request as response:
+            return await response.json(content_type=None)
+
+    async def get_user_note_info(self, user_id: str, cursor: str, cookies_str: str, xsec_token='', xsec_source='', proxies: dict = None):
+        """
+            获取用户指定位置的笔记
+            :param user_id: 你想要获取的用户的id
+            :param cursor: 你想要获取的笔记的cursor
+            :param cookies_str: 你的cookies
+            返回用户指定位置的笔记
+        """
+        res_json = None
+        try:
+            api = f"/api/sns/web/v1/user_posted"
+            params = {
+                "num": "30",
+                "cursor": cursor,
+                "user_id": user_id,
+                "image_formats": "jpg,webp,avif",
+                "xsec_token": xsec_token,
+                "xsec_source": xsec_source,
+            }
+            splice_api = splice_str(api, params)
+            res_json = await self.request('GET', splice_api, cookies_str, '', proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def iter_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None):
+        """
+           逐页获取用户所有笔记的异步生成器，每获取一页就返回该页的笔记
+           :param user_url: 你想要获取的用户的url
+           :param cookies_str: 你的cookies
+           获取失败时抛出异常
+        """
+        cursor = ''
+        urlParse = urllib.parse.urlparse(user_url)
+        user_id = urlParse.path.split("/")[-1]
+        kvs = urlParse.query.split('&')
+        kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
+        xsec_token = kvDist['xsec_token'] if 'xsec_token' in kvDist else ""
+        xsec_source = kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search"
+        while True:
+            success, msg, res_json = await self.get_user_note_info(user_id, cursor, cookies_str, xsec_token, xsec_source, proxies)
+            if not success:
+                raise Exception(msg)
+            notes = res_json["data"]["notes"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            for note in notes:
+                yield note
+            if len(notes) == 0 or not res_json["data"]["has_more"]:
+                break
+
+    async def get_user_all_notes(self, user_url: str, cookies_str: str, proxies: dict = None):
+        """
+           获取用户所有笔记
+           :param user_url: 你想要获取的用户的url
+           :param cookies_str: 你的cookies
+           返回用户的所有笔记
+        """
+        note_list = []
+        try:
+            async for note in self.iter_user_all_notes(user_url, cookies_str, proxies):
+                note_list.append(note)
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, note_list
+
+    async def get_note_info(self, url: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的详细
+            :param url: 你想要获取的笔记的url
+            :param cookies_str: 你的cookies
+            返回笔记的详细
+        """
+        res_json = None
+        try:
+            urlParse = urllib.parse.urlparse(url)
+            note_id = urlParse.path.split("/")[-1]
+            kvs = urlParse.query.split('&')
+            kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
+            api = f"/api/sns/web/v1/feed"
+            data = {
+                "source_note_id": note_id,
+                "image_formats": [
+                    "jpg",
+                    "webp",
+                    "avif"
+                ],
+                "extra": {
+                    "need_body_topic": "1"
+                },
+                "xsec_source": kvDist['xsec_source'] if 'xsec_source' in kvDist else "pc_search",
+                "xsec_token": kvDist['xsec_token']
+            }
+            res_json = await self.request('POST', api, cookies_str, data, proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def search_note(self, query: str, cookies_str: str, page=1, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            获取搜索笔记的结果，参数含义见 XHS_Apis.search_note
+            返回搜索的结果
+        """
+        res_json = None
+        try:
+            api = "/api/sns/web/v1/search/notes"
+            data = XHS_Apis.get_search_note_data(query, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo)
+            res_json = await self.request('POST', api, cookies_str, data, proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def iter_search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            指定数量逐页搜索笔记的异步生成器，每获取一页就返回该页的笔记，参数含义见 XHS_Apis.search_some_note
+            获取失败时抛出异常
+        """
+        page = 1
+        num = 0
+        while num < require_num:
+            success, msg, res_json = await self.search_note(query, cookies_str, page, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies)
+            if not success:
+                raise Exception(msg)
+            if "items" not in res_json["data"]:
+                break
+            notes = res_json["data"]["items"][:require_num - num]
+            num += len(notes)
+            for note in notes:
+                yield note
+            page += 1
+            if not res_json["data"]["has_more"]:
+                break
+
+    async def search_some_note(self, query: str, require_num: int, cookies_str: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo="", proxies: dict = None):
+        """
+            指定数量搜索笔记，参数含义见 XHS_Apis.search_some_note
+            返回搜索的结果
+        """
+        note_list = []
+        try:
+            async for note in self.iter_search_some_note(query, require_num, cookies_str, sort_type_choice, note_type, note_time, note_range, pos_distance, geo, proxies):
+                note_list.append(note)
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, note_list
+
+    async def get_note_out_comment(self, note_id: str, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取指定位置的笔记一级评论
+            :param note_id 笔记的id
+            :param cursor 指定位置的评论的cursor
+            :param cookies_str 你的cookies
+            返回指定位置的笔记一级评论
+        """
+        res_json = None
+        try:
+            api = "/api/sns/web/v2/comment/page"
+            params = {
+                "note_id": note_id,
+                "cursor": cursor,
+                "top_comment_id": "",
+                "image_formats": "jpg,webp,avif",
+                "xsec_token": xsec_token
+            }
+            splice_api = splice_str(api, params)
+            res_json = await self.request('GET', splice_api, cookies_str, '', proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def iter_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            逐页获取笔记全部一级评论的异步生成器，每获取一页就返回该页的评论
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            获取失败时抛出异常
+        """
+        cursor = ''
+        num = 0
+        while True:
+            success, msg, res_json = await self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            comments = res_json["data"]["comments"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            num += len(comments)
+            for comment in comments:
+                yield comment
+            if num == 0 or not res_json["data"]["has_more"]:
+                break
+
+    async def get_note_all_out_comment(self, note_id: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的全部一级评论
+            :param note_id 笔记的id
+            :param cookies_str 你的cookies
+            返回笔记的全部一级评论
+        """
+        note_out_comment_list = []
+        try:
+            async for comment in self.iter_note_all_out_comment(note_id, xsec_token, cookies_str, proxies):
+                note_out_comment_list.append(comment)
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, note_out_comment_list
+
+    async def get_note_inner_comment(self, comment: dict, cursor: str, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取指定位置的笔记二级评论
+            :param comment 笔记的一级评论
+            :param cursor 指定位置的评论的cursor
+            :param cookies_str 你的cookies
+            返回指定位置的笔记二级评论
+        """
+        res_json = None
+        try:
+            api = "/api/sns/web/v2/comment/sub/page"
+            params = {
+                "note_id": comment['note_id'],
+                "root_comment_id": comment['id'],
+                "num": "10",
+                "cursor": cursor,
+                "image_formats": "jpg,webp,avif",
+                "top_comment_id": '',
+                "xsec_token": xsec_token
+            }
+            splice_api = splice_str(api, params)
+            res_json = await self.request('GET', splice_api, cookies_str, '', proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def get_note_some_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None, max_num: int = None, deadline: float = None):
+        """
+            按预算获取笔记的二级评论，参数含义见 XHS_Apis.get_note_some_inner_comment
+            返回是否因预算用完而没有取全
+        """
+        truncated = False
+        try:
+            if not comment['sub_comment_has_more']:
+                return True, 'success', truncated
+            cursor = comment['sub_comment_cursor']
+            inner_comment_list = []
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    truncated = True
+                    break
+                success, msg, res_json = await self.get_note_inner_comment(comment, cursor, xsec_token, cookies_str, proxies)
+                if not success:
+                    raise Exception(msg)
+                comments = res_json["data"]["comments"]
+                if 'cursor' in res_json["data"]:
+                    cursor = str(res_json["data"]["cursor"])
+                else:
+                    break
+                comments, used_up, cut = XHS_Apis.take_budget(comments, len(inner_comment_list), max_num, res_json["data"]["has_more"])
+                inner_comment_list.extend(comments)
+                if used_up:
+                    truncated = cut
+                    break
+                if not res_json["data"]["has_more"]:
+                    break
+            comment['sub_comments'].extend(inner_comment_list)
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, truncated
+
+    async def get_note_all_inner_comment(self, comment: dict, xsec_token: str, cookies_str: str, proxies: dict = None):
+        """
+            获取笔记的全部二级评论
+            :param comment 笔记的一级评论
+            :param cookies_str 你的cookies
+            返回笔记的全部二级评论
+        """
+        success, msg, truncated = await self.get_note_some_inner_comment(comment, xsec_token, cookies_str, proxies)
+        return success, msg, comment
+
+    async def get_note_some_comment(self, url: str, cookies_str: str, proxies: dict = None, max_out_comment: int = None, max_inner_comment: int = None, expand_inner: bool = True, time_limit: float = None, max_workers: int = 10):
+        """
+            按预算获取一篇文章的评论，一级评论边翻页边并发展开二级评论，参数含义见 XHS_Apis.get_note_some_comment
+            :param max_workers: 同时获取二级评论的协程数
+            返回 {'comments': 评论列表, 'truncated': 是否因预算没有取全}
+        """
+        out_comment_list = []
+        truncated = False
+        tasks = []
+        try:
+            urlParse = urllib.parse.urlparse(url)
+            note_id = urlParse.path.split("/")[-1]
+            kvs = urlParse.query.split('&')
+            kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
+            xsec_token = kvDist['xsec_token']
+            deadline = time.monotonic() + time_limit if time_limit is not None else None
+            semaphore = asyncio.Semaphore(max(max_workers, 1))
+
+            async def expand(comment, max_num):
+                async with semaphore:
+                    return await self.get_note_some_inner_comment(comment, xsec_token, cookies_str, proxies, max_num, deadline)
+
+            cursor = ''
+            while True:
+                if deadline is not None and time.monotonic() >= deadline:
+                    truncated = True
+                    break
+                success, msg, res_json = await self.get_note_out_comment(note_id, cursor, xsec_token, cookies_str, proxies)
+                if not success:
+                    raise Exception(msg)
+                comments = res_json["data"]["comments"]
+                if 'cursor' in res_json["data"]:
+                    cursor = str(res_json["data"]["cursor"])
+                else:
+                    break
+                has_more = res_json["data"]["has_more"]
+                comments, used_up, cut = XHS_Apis.take_budget(comments, len(out_comment_list), max_out_comment, has_more)
+                if used_up:
+                    truncated = truncated or cut
+                    has_more = False
+                for comment in comments:
+                    out_comment_list.append(comment)
+                    need_expand, max_num, cut = XHS_Apis.plan_inner_comment(comment, max_inner_comment, expand_inner)
+                    truncated = truncated or cut
+                    if not need_expand:
+                        continue
+                    tasks.append(asyncio.ensure_future(expand(comment, max_num)))
+                if len(out_comment_list) == 0 or not has_more:
+                    break
+            for success, msg, inner_truncated in await asyncio.gather(*tasks):
+                if not success:
+                    raise Exception(msg)
+                truncated = truncated or inner_truncated
+            success, msg = True, '成功'
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            success = False
+            msg = str(e)
+        return success, msg, {'comments': out_comment_list, 'truncated': truncated}
+
+    async def get_note_all_comment(self, url: str, cookies_str: str, proxies: dict = None, max_workers: int = 10):
+        """
+            获取一篇文章的所有评论，一级评论边翻页边并发展开二级评论
+            :param url: 你想要获取的笔记的url
+            :param cookies_str: 你的cookies
+            :param max_workers: 同时获取二级评论的协程数
+            返回一篇文章的所有评论
+        """
+        success, msg, res = await self.get_note_some_comment(url, cookies_str, proxies, max_workers=max_workers)
+        return success, msg, res['comments']
+
+    async def get_unread_message(self, cookies_str: str, proxies: dict = None):
+        """
+            获取未读消息
+            :param cookies_str: 你的cookies
+            返回未读消息
+        """
+        res_json = None
+        try:
+            api = "/api/sns/web/unread_count"
+            res_json = await self.request('GET', api, cookies_str, '', proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def get_message_page(self, api: str, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取指定位置的消息，评论和@提醒、赞和收藏、新增关注共用
+            :param api: 消息的api
+            :param cursor: 你想要获取的消息的cursor
+            :param cookies_str: 你的cookies
+            返回指定位置的消息
+        """
+        res_json = None
+        try:
+            params = {
+                "num": "20",
+                "cursor": cursor
+            }
+            splice_api = splice_str(api, params)
+            res_json = await self.request('GET', splice_api, cookies_str, '', proxies)
+            success, msg = res_json["success"], res_json["msg"]
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, res_json
+
+    async def iter_all_message(self, api: str, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部消息的异步生成器，评论和@提醒、赞和收藏、新增关注共用
+            :param api: 消息的api
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线 {'time': 消息时间, 'id': 消息id}，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            获取失败时抛出异常
+        """
+        cursor = ''
+        while True:
+            success, msg, res_json = await self.get_message_page(api, cursor, cookies_str, proxies)
+            if not success:
+                raise Exception(msg)
+            messages = res_json["data"]["message_list"]
+            if 'cursor' in res_json["data"]:
+                cursor = str(res_json["data"]["cursor"])
+            else:
+                break
+            for message in messages:
+                if watermark is not None and (message['id'] == watermark['id'] or int(message['time']) < watermark['time']):
+                    return
+                yield message
+            if not res_json["data"]["has_more"]:
+                break
+
+    async def get_all_message(self, api: str, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            获取全部的消息，评论和@提醒、赞和收藏、新增关注共用
+            :param api: 消息的api
+            :param cookies_str: 你的cookies
+            :param watermark: 上次同步的水位线，遇到水位线那条消息或更早的消息就停止，为空时获取全部
+            返回全部的消息
+        """
+        message_list = []
+        try:
+            async for message in self.iter_all_message(api, cookies_str, proxies, watermark):
+                message_list.append(message)
+            success, msg = True, '成功'
+        except Exception as e:
+            success = False
+            msg = str(e)
+        return success, msg, message_list
+
+    async def get_metions(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取评论和@提醒
+        """
+        return await self.get_message_page("/api/sns/web/v1/you/mentions", cursor, cookies_str, proxies)
+
+    def iter_all_metions(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部评论和@提醒的异步生成器
+        """
+        return self.iter_all_message("/api/sns/web/v1/you/mentions", cookies_str, proxies, watermark)
+
+    async def get_all_metions(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            获取全部的评论和@提醒
+        """
+        return await self.get_all_message("/api/sns/web/v1/you/mentions", cookies_str, proxies, watermark)
+
+    async def get_likesAndcollects(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取赞和收藏
+        """
+        return await self.get_message_page("/api/sns/web/v1/you/likes", cursor, cookies_str, proxies)
+
+    def iter_all_likesAndcollects(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部赞和收藏的异步生成器
+        """
+        return self.iter_all_message("/api/sns/web/v1/you/likes", cookies_str, proxies, watermark)
+
+    async def get_all_likesAndcollects(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            获取全部的赞和收藏
+        """
+        return await self.get_all_message("/api/sns/web/v1/you/likes", cookies_str, proxies, watermark)
+
+    async def get_new_connections(self, cursor: str, cookies_str: str, proxies: dict = None):
+        """
+            获取新增关注
+        """
+        return await self.get_message_page("/api/sns/web/v1/you/connections", cursor, cookies_str, proxies)
+
+    def iter_all_new_connections(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            逐页获取全部新增关注的异步生成器
+        """
+        return self.iter_all_message("/api/sns/web/v1/you/connections", cookies_str, proxies, watermark)
+
+    async def get_all_new_connections(self, cookies_str: str, proxies: dict = None, watermark: dict = None):
+        """
+            获取全部的新增关注
+        """
+        return await self.get_all_message("/api/sns/web/v1/you/connections", cookies_str, proxies, watermark)
@@ -1,6 +1,7 @@
 from flask import Flask, render_template, request, jsonify, send_from_directory
 from main import Data_Spider
 from xhs_utils.common_util import init
+from xhs_utils.xhs_util import warmup
 import threading
 import time
 import os
@@ -10,6 +11,8 @@ app = Flask(__name__)
 # 初始化爬虫
 cookies_str, base_path = init()
 data_spider = Data_Spider()
+# 后台预热签名进程，不阻塞页面服务
+threading.Thread(target=warmup, daemon=True).start()
 
 # 爬取状态管理
 crawl_status = {
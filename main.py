@@ -1,24 +1,40 @@
 import json
 import os
+import urllib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from loguru import logger
 from apis.xhs_pc_apis import XHS_Apis
 from xhs_utils.common_util import init
-from xhs_utils.data_util import handle_note_info, download_note, save_to_xlsx
+from xhs_utils.cookie_util import trans_cookies
+from xhs_utils.data_util import handle_note_info, download_note, download_notes, save_to_xlsx, search_note_may_pass
+from xhs_utils.pipeline_util import Pipeline
+from xhs_utils.rate_util import Rate_Limiter
+from xhs_utils.sink_util import Multi_Sink, Xlsx_Sink
+from xhs_utils.watermark_util import Watermark_Store
 
 
 class Data_Spider():
-    def __init__(self):
-        self.xhs_apis = XHS_Apis()
+    def __init__(self, xhs_apis: XHS_Apis = None, watermark_store: Watermark_Store = None):
+        """
+        :param xhs_apis: 使用的api客户端，默认为 XHS_Apis()，可传入使用其它签名后端或mock地址的客户端
+        :param watermark_store: 增量同步的水位线，默认在第一次增量同步时创建 datas/watermark.db
+        """
+        self.xhs_apis = xhs_apis or XHS_Apis()
+        # 按账号限速，多个线程共用
+        self.rate_limiter = Rate_Limiter()
+        self.watermark_store = watermark_store
 
-    def spider_note(self, note_url: str, cookies_str: str, proxies=None):
+    def spider_note(self, note_url: str, cookies_str: str, proxies=None, rate_limit=None):
         """
         爬取一个笔记的信息
         :param note_url:
         :param cookies_str:
+        :param rate_limit: 每个账号每秒最多请求数，为空不限速
         :return:
         """
         note_info = None
         try:
+            self.rate_limiter.wait(trans_cookies(cookies_str).get('a1', cookies_str), rate_limit)
             success, msg, note_info = self.xhs_apis.get_note_info(note_url, cookies_str, proxies)
             if success and note_info and 'data' in note_info and 'items' in note_info['data'] and note_info['data']['items']:
                 note_info = note_info['data']['items'][0]
@@ -33,7 +49,7 @@ class Data_Spider():
         logger.info(f'爬取笔记信息 {note_url}: {success}, msg: {msg}')
         return success, msg, note_info
 
-    def spider_some_note(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, progress_callback=None):
+    def spider_some_note(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, progress_callback=None, max_workers=1, rate_limit=None):
         """
         爬取一些笔记的信息
         :param notes:
@@ -42,6 +58,8 @@ class Data_Spider():
         :param min_likes: 最小点赞数阈值
         :param min_collects: 最小收藏数阈值
         :param progress_callback: 进度回调函数
+        :param max_workers: 并发爬取笔记的线程数，1 为逐条爬取
+        :param rate_limit: 每个账号每秒最多请求数，为空不限速
         :return:
         """
         if (save_choice == 'all' or save_choice == 'excel') and excel_name == '':
@@ -50,15 +68,29 @@ class Data_Spider():
         total_notes = len(notes)
         note_list = []
         filtered_list = []
-        
-        for index, note_url in enumerate(notes):
-            # 计算当前进度
-            progress = 20 + int((index / total_notes) * 60)  # 20% 到 80% 之间
-            if progress_callback:
-                progress_callback(progress, f'正在爬取第 {index+1}/{total_notes} 条笔记...')
-            
-            # 爬取单条笔记
-            success, msg, note_info = self.spider_note(note_url, cookies_str, proxies)
+        # 按notes的顺序保存结果，并发时结果也保持原顺序
+        results = [None] * total_notes
+
+        if max_workers <= 1:
+            for index, note_url in enumerate(notes):
+                # 计算当前进度
+                progress = 20 + int((index / total_notes) * 60)  # 20% 到 80% 之间
+                if progress_callback:
+                    progress_callback(progress, f'正在爬取第 {index+1}/{total_notes} 条笔记...')
+
+                # 爬取单条笔记
+                results[index] = self.spider_note(note_url, cookies_str, proxies, rate_limit)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self.spider_note, note_url, cookies_str, proxies, rate_limit): index for index, note_url in enumerate(notes)}
+                # 进度回调只在当前线程中按完成数量递增调用
+                for done, future in enumerate(as_completed(futures)):
+                    results[futures[future]] = future.result()
+                    if progress_callback:
+                        progress = 20 + int(((done + 1) / total_notes) * 60)
+                        progress_callback(progress, f'已爬取 {done+1}/{total_notes} 条笔记...')
+
+        for success, msg, note_info in results:
             if note_info is not None and success:
                 note_list.append(note_info)
                 # 直接使用解析后的数字进行筛选
@@ -69,10 +101,12 @@ class Data_Spider():
         if progress_callback:
             progress_callback(80, '爬取完成，开始保存数据...')
         
-        # 只下载符合条件的笔记媒体
-        for note_info in filtered_list:
-            if save_choice == 'all' or 'media' in save_choice:
-                download_note(note_info, base_path['media'], save_choice)
+        # 只下载符合条件的笔记媒体，所有笔记的图片和视频共用下载线程池并发下载
+        failed_notes = []
+        if save_choice == 'all' or 'media' in save_choice:
+            save_paths, failed_notes = download_notes(filtered_list, base_path['media'], save_choice)
+            if failed_notes:
+                logger.warning(f'{len(failed_notes)} 条笔记的媒体下载失败，重新运行会继续下载: {[note_id for note_id, msg in failed_notes]}')
         
         # 只保存符合条件的笔记到Excel
         if save_choice == 'all' or save_choice == 'excel':
@@ -80,15 +114,108 @@ class Data_Spider():
             # 传递搜索词给save_to_xlsx函数
             save_to_xlsx(filtered_list, file_path, search_query=excel_name)
         
-        # 更新进度：保存完成
+        # 更新进度：保存完成，有媒体下载失败时告诉调用方
         if progress_callback:
-            progress_callback(100, '爬取完成')
+            progress_callback(100, f'爬取完成，{len(failed_notes)} 条笔记的媒体下载失败' if failed_notes else '爬取完成')
         
         logger.info(f'原始笔记数量: {len(note_list)}, 符合条件的笔记数量: {len(filtered_list)}')
         return filtered_list
 
 
-    def spider_user_all_note(self, user_url: str, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None):
+    def spider_some_note_pipeline(self, notes: list, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, progress_callback=None, fetch_workers=4, parse_workers=1, download_workers=4, queue_size=16, rate_limit=None, sinks: list = None, skip_note_ids: set = None):
+        """
+        用流水线爬取一些笔记的信息，获取详情、解析、筛选、下载媒体、汇总结果各阶段同时运行
+        参数和返回值与 spider_some_note 一致，结果按 notes 的顺序保存
+        :param fetch_workers: 获取笔记详情的线程数
+        :param parse_workers: 解析笔记信息的线程数
+        :param download_workers: 同时下载媒体的笔记数，文件级的并发由共用的下载线程池限制
+        :param queue_size: 各阶段之间队列的长度，下游处理不过来时上游等待
+        :param rate_limit: 每个账号每秒最多请求数，为空不限速
+        :param sinks: 结果输出列表，如 [Jsonl_Sink(...), Csv_Sink(...)]，不为空时每条符合条件的笔记产生后立即写入，不再保存在内存里，
+                      excel 在结束时生成，返回值改为按 notes 顺序的已写入笔记id列表，sinks 由调用方关闭
+        :param skip_note_ids: 跳过的笔记id，断点续爬时可传入 Jsonl_Sink.load_keys(...) 的结果
+        :return:
+        """
+        if (save_choice == 'all' or save_choice == 'excel') and excel_name == '':
+            raise ValueError('excel_name 不能为空')
+
+        total_notes = len(notes)
+        a1 = trans_cookies(cookies_str).get('a1', cookies_str)
+        save_media = save_choice == 'all' or 'media' in save_choice
+        results = []
+        save_excel = save_choice == 'all' or save_choice == 'excel'
+        excel_path = os.path.abspath(os.path.join(base_path['excel'], f'{excel_name}.xlsx')) if save_excel else None
+        own_sinks = [Xlsx_Sink(excel_path, search_query=excel_name)] if sinks is not None and save_excel else []
+        sink = Multi_Sink(list(sinks) + own_sinks) if sinks is not None else None
+
+        def fetch(item):
+            index, note_url = item
+            self.rate_limiter.wait(a1, rate_limit)
+            success, msg, note_info = self.xhs_apis.get_note_info(note_url, cookies_str, proxies)
+            if not (success and note_info and 'data' in note_info and 'items' in note_info['data'] and note_info['data']['items']):
+                logger.info(f'爬取笔记信息 {note_url}: False, msg: 获取到的笔记信息不完整，success={success}, data={note_info}')
+                return None
+            return index, note_url, note_info['data']['items'][0]
+
+        def parse(item):
+            index, note_url, note_info = item
+            note_info['url'] = note_url
+            return index, handle_note_info(note_info)
+
+        def filter_note(item):
+            index, note_info = item
+            if note_info['liked_count'] > min_likes or note_info['collected_count'] > min_collects:
+                return item
+            return None
+
+        def download(item):
+            index, note_info = item
+            try:
+                download_note(note_info, base_path['media'], save_choice)
+            except Exception as e:
+                logger.error(f'下载笔记 {note_info["note_id"]} 失败: {e}')
+            return item
+
+        def collect(item):
+            if sink is not None:
+                index, note_info = item
+                sink.write(note_info)
+                item = (index, note_info['note_id'])
+            results.append(item)
+            if progress_callback:
+                progress_callback(20 + int((len(results) / max(total_notes, 1)) * 60), f'已完成 {len(results)} 条符合条件的笔记...')
+
+        pipeline = Pipeline()
+        pipeline.add_stage('fetch', fetch, fetch_workers, queue_size)
+        pipeline.add_stage('parse', parse, parse_workers, queue_size)
+        pipeline.add_stage('filter', filter_note, 1, queue_size)
+        if save_media:
+            pipeline.add_stage('download', download, download_workers, queue_size)
+        pipeline.add_stage('collect', collect, 1, queue_size)
+        if skip_note_ids:
+            items = ((index, note_url) for index, note_url in enumerate(notes) if urllib.parse.urlparse(note_url).path.split('/')[-1] not in skip_note_ids)
+        else:
+            items = enumerate(notes)
+        try:
+            stats = pipeline.run(items)
+        finally:
+            if sink is not None:
+                sink.checkpoint()
+                for own_sink in own_sinks:
+                    own_sink.close()
+        filtered_list = [note_info for index, note_info in sorted(results, key=lambda item: item[0])]
+
+        if progress_callback:
+            progress_callback(80, '爬取完成，开始保存数据...')
+        if save_excel and sink is None:
+            save_to_xlsx(filtered_list, excel_path, search_query=excel_name)
+        if progress_callback:
+            progress_callback(100, '爬取完成')
+
+        logger.info(f'原始笔记数量: {stats["parse"]["out"]}, 符合条件的笔记数量: {len(filtered_list)}')
+        return filtered_list
+
+    def spider_user_all_note(self, user_url: str, cookies_str: str, base_path: dict, save_choice: str, excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, max_workers=1, rate_limit=None):
         """
         爬取一个用户的所有笔记
         :param user_url:
@@ -96,6 +223,8 @@ class Data_Spider():
         :param base_path:
         :param min_likes: 最小点赞数阈值
         :param min_collects: 最小收藏数阈值
+        :param max_workers: 并发爬取笔记的线程数
+        :param rate_limit: 每个账号每秒最多请求数
         :return:
         """
         note_list = []
@@ -108,14 +237,14 @@ class Data_Spider():
                     note_list.append(note_url)
             if save_choice == 'all' or save_choice == 'excel':
                 excel_name = user_url.split('/')[-1].split('?')[0]
-            filtered_list = self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, min_likes, min_collects, proxies)
+            filtered_list = self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, min_likes, min_collects, proxies, max_workers=max_workers, rate_limit=rate_limit)
         except Exception as e:
             success = False
             msg = e
         logger.info(f'爬取用户所有视频 {user_url}: {success}, msg: {msg}')
         return note_list, success, msg
 
-    def spider_some_search_note(self, query: str, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None,  excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, progress_callback=None):
+    def spider_some_search_note(self, query: str, require_num: int, cookies_str: str, base_path: dict, save_choice: str, sort_type_choice=0, note_type=0, note_time=0, note_range=0, pos_distance=0, geo: dict = None,  excel_name: str = '', min_likes=1000, min_collects=2000, proxies=None, progress_callback=None, max_workers=1, rate_limit=None, prefilter=False):
         """
             指定数量搜索笔记，设置排序方式和笔记类型和笔记数量
             :param query 搜索的关键词
@@ -130,6 +259,9 @@ class Data_Spider():
             :param min_likes 最小点赞数阈值
             :param min_collects 最小收藏数阈值
             :param progress_callback 进度回调函数
+            :param max_workers 并发爬取笔记的线程数
+            :param rate_limit 每个账号每秒最多请求数
+            :param prefilter 是否先用搜索结果中的互动数据预筛选，跳过不可能满足阈值的笔记详情请求
             返回搜索的结果
         """
         note_list = []
@@ -142,6 +274,9 @@ class Data_Spider():
             if success:
                 notes = list(filter(lambda x: x['model_type'] == "note", notes))
                 logger.info(f'搜索关键词 {query} 笔记数量: {len(notes)}')
+                if prefilter:
+                    notes = list(filter(lambda x: search_note_may_pass(x, min_likes, min_collects), notes))
+                    logger.info(f'搜索关键词 {query} 预筛选后笔记数量: {len(notes)}')
                 
                 # 更新进度：搜索完成，开始爬取笔记
                 if progress_callback:
@@ -154,7 +289,7 @@ class Data_Spider():
                 excel_name = query
             
             # 调用spider_some_note并传递进度回调
-            filtered_list = self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, min_likes, min_collects, proxies, progress_callback)
+            filtered_list = self.spider_some_note(note_list, cookies_str, base_path, save_choice, excel_name, min_likes, min_collects, proxies, progress_callback, max_workers, rate_limit)
         except Exception as e:
             success = False
             msg = e
@@ -163,6 +298,81 @@ class Data_Spider():
         logger.info(f'搜索关键词 {query} 笔记: {success}, msg: {msg}')
         return note_list, success, msg
 
+    def get_watermark_store(self):
+        if self.watermark_store is None:
+            self.watermark_store = Watermark_Store()
+        return self.watermark_store
+
+    def sync_note_comment(self, note_url: str, cookies_str: str, proxies=None):
+        """
+        增量同步一篇笔记的一级评论，只获取上次同步之后的新评论，成功后推进水位线
+        :param note_url: 笔记的url，需要带 xsec_token
+        :param cookies_str: 你的cookies
+        返回新的一级评论
+        """
+        new_comments = []
+        try:
+            urlParse = urllib.parse.urlparse(note_url)
+            note_id = urlParse.path.split("/")[-1]
+            kvs = urlParse.query.split('&')
+            kvDist = {kv.split('=')[0]: kv.split('=')[1] for kv in kvs}
+            watermark_store = self.get_watermark_store()
+            watermark = watermark_store.get('note_comment', note_id)
+            success, msg, new_comments = self.xhs_apis.get_note_new_out_comment(note_id, kvDist['xsec_token'], cookies_str, watermark, proxies)
+            if not success:
+                raise Exception(msg)
+            if new_comments:
+                newest = max(new_comments, key=lambda comment: int(comment['create_time']))
+                watermark_store.update('note_comment', note_id, newest['create_time'], newest['id'])
+        except Exception as e:
+            success = False
+            msg = e
+        logger.info(f'增量同步笔记 {note_url} 评论: {success}, 新评论数量: {len(new_comments)}, msg: {msg}')
+        return success, msg, new_comments
+
+    def sync_message(self, scope: str, get_all_message, cookies_str: str, proxies=None):
+        """
+        增量同步一类消息，只获取上次同步之后的新消息，成功后推进该账号的水位线
+        :param scope: 水位线的scope，如 metions
+        :param get_all_message: 获取全部消息的api，如 self.xhs_apis.get_all_metions
+        :param cookies_str: 你的cookies，水位线按其中的a1区分账号
+        返回新的消息
+        """
+        new_messages = []
+        try:
+            a1 = trans_cookies(cookies_str).get('a1', cookies_str)
+            watermark_store = self.get_watermark_store()
+            watermark = watermark_store.get(scope, a1)
+            success, msg, new_messages = get_all_message(cookies_str, proxies, watermark)
+            if not success:
+                raise Exception(msg)
+            if new_messages:
+                newest = max(new_messages, key=lambda message: int(message['time']))
+                watermark_store.update(scope, a1, newest['time'], newest['id'])
+        except Exception as e:
+            success = False
+            msg = e
+        logger.info(f'增量同步 {scope} 消息: {success}, 新消息数量: {len(new_messages)}, msg: {msg}')
+        return success, msg, new_messages
+
+    def sync_metions(self, cookies_str: str, proxies=None):
+        """
+        增量同步评论和@提醒
+        """
+        return self.sync_message('metions', self.xhs_apis.get_all_metions, cookies_str, proxies)
+
+    def sync_likesAndcollects(self, cookies_str: str, proxies=None):
+        """
+        增量同步赞和收藏
+        """
+        return self.sync_message('likesAndcollects', self.xhs_apis.get_all_likesAndcollects, cookies_str, proxies)
+
+    def sync_new_connections(self, cookies_str: str, proxies=None):
+        """
+        增量同步新增关注
+        """
+        return self.sync_message('new_connections', self.xhs_apis.get_all_new_connections, cookies_str, proxies)
+
 if __name__ == '__main__':
     """
         此文件为爬虫的入口文件，可以直接运行
@@ -0,0 +1,89 @@
+// 常驻签名进程：启动时加载一次签名脚本，之后通过 stdin/stdout 按行收发 json
+// 用法: node xhs_sign_worker.js xhs_xs_xsc_56.js xhs_xray.js
+// 请求: {"id": 1, "method": "get_request_headers_params", "args": [...]}
+// 批量: {"id": 2, "method": "batch", "args": [[method, args], ...]}，result 为各次调用结果的数组
+// 响应: {"id": 1, "result": ...} 或 {"id": 1, "error": "..."}
+const crypto = require("crypto");
+const fs = require("fs");
+const path = require("path");
+const readline = require("readline");
+const vm = require("vm");
+
+const write = process.stdout.write.bind(process.stdout);
+// xray 打包代码会 console.log 模块号，避免污染 stdout 协议
+console.log = function () {};
+
+// v8编译缓存目录，由 XHS_JS_CACHE_DIR 指定，不指定则不缓存
+const cacheDir = process.env.XHS_JS_CACHE_DIR;
+
+function cacheFile(file, source) {
+  const hash = crypto
+    .createHash("sha1")
+    .update(process.version + "\0" + source)
+    .digest("hex");
+  return path.join(cacheDir, path.basename(file) + "." + hash + ".cache");
+}
+
+function loadScript(file) {
+  const source = fs.readFileSync(file, "utf-8");
+  const cached = cacheDir ? cacheFile(file, source) : null;
+  let cachedData;
+  if (cached && fs.existsSync(cached)) {
+    cachedData = fs.readFileSync(cached);
+  }
+  const script = new vm.Script(source, { filename: file, cachedData });
+  script.runInThisContext();
+  if (cached && (!cachedData || script.cachedDataRejected)) {
+    try {
+      fs.mkdirSync(cacheDir, { recursive: true });
+      const tmp = cached + "." + process.pid;
+      fs.writeFileSync(tmp, script.createCachedData());
+      fs.renameSync(tmp, cached);
+    } catch (e) {
+      // 缓存写入失败不影响签名
+    }
+  }
+}
+
+// 与 execjs 一样把脚本放在全局作用域执行，脚本里的函数声明直接成为全局函数
+global.require = require;
+for (const script of process.argv.slice(2)) {
+  loadScript(path.resolve(__dirname, script));
+}
+
+function callMethod(method, args) {
+  const fn = global[method];
+  if (typeof fn !== "function") {
+    throw new Error("unknown method " + method);
+  }
+  return fn.apply(null, args || []);
+}
+
+// 一次往返完成多次调用，序列化和管道开销只付一次
+function batch(calls) {
+  return calls.map(([method, args]) => callMethod(method, args));
+}
+
+function reply(id, result, error) {
+  const msg = error === undefined ? { id, result } : { id, error };
+  write(JSON.stringify(msg) + "\n");
+}
+
+const rl = readline.createInterface({ input: process.stdin });
+rl.on("line", (line) => {
+  let id = null;
+  try {
+    const req = JSON.parse(line);
+    id = req.id;
+    if (req.method === "batch") {
+      reply(id, batch(req.args[0]));
+    } else {
+      reply(id, callMethod(req.method, req.args));
+    }
+  } catch (e) {
+    reply(id, undefined, String((e && e.stack) || e));
+  }
+});
+rl.on("close", () => process.exit(0));
+
+reply(0, "ready");
@@ -0,0 +1,59 @@
+import threading
+
+
+class Comment_Stub():
+    """
+        按页返回的假评论数据，一级评论每页 out_page 条，共 out_total 条
+        每条一级评论自带 sub_initial 条二级评论，共 sub_total 条，二级评论每页 sub_page 条
+    """
+    def __init__(self, out_total=25, out_page=10, sub_initial=3, sub_total=12, sub_page=5):
+        self.out_total = out_total
+        self.out_page = out_page
+        self.sub_initial = sub_initial
+        self.sub_total = sub_total
+        self.sub_page = sub_page
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def out_comment(self, note_id, cursor, xsec_token, cookies_str, proxies=None):
+        with self.lock:
+            self.requests += 1
+        start = int(cursor or 0)
+        end = min(start + self.out_page, self.out_total)
+        comments = [{
+            'id': f'c{i}',
+            'sub_comments': [{'id': f'c{i}_s{j}'} for j in range(min(self.sub_initial, self.sub_total))],
+            'sub_comment_has_more': self.sub_total > self.sub_initial,
+            'sub_comment_cursor': str(self.sub_initial),
+        } for i in range(start, end)]
+        return True, '成功', {'data': {'comments': comments, 'cursor': str(end), 'has_more': end < self.out_total}}
+
+    def inner_comment(self, comment, cursor, xsec_token, cookies_str, proxies=None):
+        with self.lock:
+            self.requests += 1
+        start = int(cursor)
+        end = min(start + self.sub_page, self.sub_total)
+        comments = [{'id': f'{comment["id"]}_s{j}'} for j in range(start, end)]
+        return True, '成功', {'data': {'comments': comments, 'cursor': str(end), 'has_more': end < self.sub_total}}
+
+
+# (stub参数, get_note_some_comment参数, 一级评论数, 每条一级评论的二级评论数, truncated)
+budget_cases = [
+    ({}, {}, 25, 12, False),
+    # 一级评论预算刚好在最后一页用完，没有丢弃任何评论
+    ({'out_total': 20}, {'max_out_comment': 20}, 20, 12, False),
+    # 预算在页边界用完但还有下一页
+    ({}, {'max_out_comment': 20}, 20, 12, True),
+    ({}, {'max_out_comment': 15}, 15, 12, True),
+    ({}, {'max_out_comment': 0}, 0, 0, True),
+    # 二级评论预算刚好等于总数
+    ({}, {'max_inner_comment': 12}, 25, 12, False),
+    ({}, {'max_inner_comment': 10}, 25, 10, True),
+    # 自带的二级评论已经超出预算，直接裁剪
+    ({}, {'max_inner_comment': 2}, 25, 2, True),
+    ({}, {'max_inner_comment': 3}, 25, 3, True),
+    ({}, {'expand_inner': False}, 25, 3, True),
+    ({'sub_total': 3}, {'expand_inner': False}, 25, 3, False),
+    ({}, {'max_out_comment': 12, 'max_inner_comment': 7}, 12, 7, True),
+    ({}, {'time_limit': 0}, 0, 0, True),
+]
@@ -0,0 +1,43 @@
+import os
+
+from tests.test_download_util import Stub_Media_Response
+from xhs_utils.data_util import download_notes
+from xhs_utils.download_util import Download_Pool
+from xhs_utils.manifest_util import Media_Manifest
+
+
+class Stub_Image_Session():
+    """
+        url里带 missing 的图片返回404，其它返回固定内容
+    """
+    def get(self, url, headers=None, stream=False, timeout=None):
+        if 'missing' in url:
+            return Stub_Media_Response(404)
+        return Stub_Media_Response(200, {'Content-Length': '4'}, b'jpeg')
+
+
+def make_note(note_id, image_list):
+    return {
+        'note_id': note_id, 'note_url': f'https://www.xiaohongshu.com/explore/{note_id}', 'note_type': '图集',
+        'user_id': 'u1', 'home_url': '', 'nickname': '用户', 'avatar': '', 'title': f'标题{note_id}', 'desc': '',
+        'liked_count': 0, 'collected_count': 0, 'comment_count': 0, 'share_count': 0, 'video_cover': None,
+        'video_addr': None, 'image_list': image_list, 'tags': [], 'upload_time': '', 'ip_location': '',
+    }
+
+
+def test_download_notes_returns_failed_notes(tmp_path):
+    pool = Download_Pool(max_workers=2, session=Stub_Image_Session(), tries=2, delay=0)
+    manifest = Media_Manifest(':memory:')
+    note_infos = [
+        make_note('n1', ['https://img.example.com/a']),
+        make_note('n2', ['https://img.example.com/b', 'https://img.example.com/missing']),
+        make_note('n3', ['https://img.example.com/c']),
+    ]
+    save_paths, failed_notes = download_notes(note_infos, str(tmp_path), 'media', download_pool=pool, manifest=manifest)
+    pool.close()
+    assert [os.path.basename(save_path) for save_path in save_paths] == ['标题n1_n1', '标题n3_n3']
+    assert [note_id for note_id, msg in failed_notes] == ['n2']
+    assert '404' in failed_notes[0][1]
+    # 失败笔记里下载成功的图片已经记入清单，重新运行时只下载失败的文件
+    assert manifest.get('n2', 'image_0') is not None
+    assert manifest.get('n2', 'image_1') is None
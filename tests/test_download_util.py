@@ -0,0 +1,270 @@
+import os
+import re
+import threading
+import time
+
+import pytest
+
+from xhs_utils import download_util
+from xhs_utils.download_util import Download_Pool, download_file, part_suffix, stream_download, validator_suffix
+
+url = 'https://sns-video.example.com/video.mp4'
+
+
+class Stub_Media_Response():
+    def __init__(self, status_code, headers=None, body=b'', fail_after=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise Exception(f'HTTP {self.status_code}')
+
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.body), chunk_size):
+            if self.fail_after is not None and i >= self.fail_after:
+                raise Exception('连接中断')
+            yield self.body[i:i + chunk_size]
+
+
+class Stub_Media_Session():
+    """
+        按Range和If-Range返回 content 的内容，记录每次请求的请求头
+        :param allow_range: 为False时忽略Range，总是返回200和完整内容
+        :param fail_after: 第一次请求传输这么多字节后中断
+    """
+    def __init__(self, content: bytes, etag='"v1"', allow_range=True, fail_after=None):
+        self.content = content
+        self.etag = etag
+        self.allow_range = allow_range
+        self.fail_after = fail_after
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = headers or {}
+        self.requests.append(dict(headers))
+        fail_after, self.fail_after = self.fail_after, None
+        size = len(self.content)
+        base = {'ETag': self.etag} if self.etag else {}
+        match = re.fullmatch(r'bytes=(\d+)-(\d*)', headers.get('Range', ''))
+        if not self.allow_range or not match or ('If-Range' in headers and headers['If-Range'] != self.etag):
+            return Stub_Media_Response(200, {**base, 'Content-Length': str(size)}, self.content, fail_after)
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start >= size:
+            return Stub_Media_Response(416, {'Content-Range': f'bytes */{size}'})
+        body = self.content[start:end + 1]
+        return Stub_Media_Response(206, {**base, 'Content-Length': str(len(body)), 'Content-Range': f'bytes {start}-{end}/{size}'}, body, fail_after)
+
+
+def read(path):
+    with open(path, mode='rb') as f:
+        return f.read()
+
+
+def test_interrupted_download_resumes_with_if_range(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    session = Stub_Media_Session(content, fail_after=300)
+    with pytest.raises(Exception, match='连接中断'):
+        download_file(session, url, file_path, chunk_size=100)
+    assert not os.path.exists(file_path)
+    assert read(file_path + part_suffix) == content[:300]
+    download_file(session, url, file_path, chunk_size=100)
+    assert session.requests[1] == {'Range': 'bytes=300-', 'If-Range': '"v1"'}
+    assert read(file_path) == content
+
+
+def test_changed_file_restarts_when_if_range_fails(tmp_path):
+    file_path = str(tmp_path / 'video.mp4')
+    session = Stub_Media_Session(os.urandom(1000), fail_after=300)
+    with pytest.raises(Exception):
+        download_file(session, url, file_path, chunk_size=100)
+    session.content, session.etag = os.urandom(800), '"v2"'
+    download_file(session, url, file_path, chunk_size=100)
+    assert read(file_path) == session.content
+
+
+def test_server_ignoring_range_restarts_from_scratch(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    session = Stub_Media_Session(content, allow_range=False, fail_after=300)
+    with pytest.raises(Exception):
+        download_file(session, url, file_path, chunk_size=100)
+    download_file(session, url, file_path, chunk_size=100)
+    assert session.requests[1]['Range'] == 'bytes=300-'
+    assert read(file_path) == content
+
+
+def test_ranged_chunk_rejects_server_ignoring_range(tmp_path):
+    part_path = str(tmp_path / 'video.mp4.part1')
+    session = Stub_Media_Session(os.urandom(1000), allow_range=False)
+    with pytest.raises(Exception, match='不支持Range请求'):
+        stream_download(session, url, part_path, 100, start=500, end=999)
+    assert not os.path.exists(part_path)
+
+
+def test_416_with_complete_part_is_accepted(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    with open(file_path + part_suffix, mode='wb') as f:
+        f.write(content)
+    session = Stub_Media_Session(content)
+    download_file(session, url, file_path, chunk_size=100)
+    assert len(session.requests) == 1
+    assert read(file_path) == content
+
+
+def test_416_with_oversize_part_restarts(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    with open(file_path + part_suffix, mode='wb') as f:
+        f.write(os.urandom(1500))
+    session = Stub_Media_Session(content)
+    download_file(session, url, file_path, chunk_size=100)
+    assert [headers.get('Range') for headers in session.requests] == ['bytes=1500-', None]
+    assert read(file_path) == content
+
+
+def test_mismatched_content_range_discards_part(tmp_path):
+    class Shifted_Session(Stub_Media_Session):
+        def get(self, url, headers=None, stream=False, timeout=None):
+            res = super().get(url, headers, stream, timeout)
+            res.headers['Content-Range'] = 'bytes 0-999/1000'
+            return res
+    part_path = str(tmp_path / 'video.mp4.part')
+    with open(part_path, mode='wb') as f:
+        f.write(b'x' * 300)
+    with pytest.raises(Exception, match='不一致'):
+        stream_download(Shifted_Session(os.urandom(1000)), url, part_path, 100)
+    assert not os.path.exists(part_path)
+
+
+def test_chunked_download_merges_in_order(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    session = Stub_Media_Session(content)
+    download_file(session, url, file_path, chunks=4, min_chunk_size=100, chunk_size=64)
+    assert read(file_path) == content
+    assert sorted(os.listdir(tmp_path)) == ['video.mp4']
+
+
+def test_chunked_merge_size_mismatch_discards_chunks(tmp_path, monkeypatch):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    session = Stub_Media_Session(content)
+
+    def short_chunk(session, url, file_path, chunk_size, start, end, timeout):
+        # 模拟某一段少写了字节却没有报错
+        with open(file_path, mode='wb') as f:
+            f.write(content[start:end])
+    monkeypatch.setattr(download_util, 'stream_download', short_chunk)
+    with pytest.raises(Exception, match='分段下载大小不一致'):
+        download_file(session, url, file_path, chunks=4, min_chunk_size=100, chunk_size=64)
+    assert os.listdir(tmp_path) == []
+    monkeypatch.undo()
+    download_file(session, url, file_path, chunks=4, min_chunk_size=100, chunk_size=64)
+    assert read(file_path) == content
+
+
+def test_file_appears_only_after_complete_download(tmp_path):
+    content = os.urandom(1000)
+    file_path = str(tmp_path / 'video.mp4')
+    with open(file_path, mode='wb') as f:
+        f.write(b'old')
+    session = Stub_Media_Session(content, fail_after=500)
+    with pytest.raises(Exception):
+        download_file(session, url, file_path, chunk_size=100)
+    assert read(file_path) == b'old'
+    assert os.path.exists(file_path + part_suffix + validator_suffix)
+    download_file(session, url, file_path, chunk_size=100)
+    assert read(file_path) == content
+    assert sorted(os.listdir(tmp_path)) == ['video.mp4']
+
+
+class Host_Tracker():
+    """
+        记录每个host同时占用的连接数，任务在 release 之前一直占着连接
+    """
+    def __init__(self):
+        self.active = {}
+        self.max_active = {}
+        self.finished = []
+        self.lock = threading.Lock()
+        self.release = {}
+
+    def task(self, host, name, slots=1):
+        with self.lock:
+            self.active[host] = self.active.get(host, 0) + slots
+            self.max_active[host] = max(self.max_active.get(host, 0), self.active[host])
+            event = self.release.setdefault(host, threading.Event())
+        event.wait(5)
+        with self.lock:
+            self.active[host] -= slots
+            self.finished.append(name)
+        return name
+
+
+def test_download_pool_full_host_does_not_block_other_hosts():
+    pool = Download_Pool(max_workers=4, max_per_host=1, session=object(), delay=0)
+    tracker = Host_Tracker()
+    slow = [pool.submit(f'https://slow.example.com/{i}', tracker.task, 'slow', f'slow{i}') for i in range(6)]
+    tracker.release['fast'] = threading.Event()
+    tracker.release['fast'].set()
+    fast = [pool.submit(f'https://fast.example.com/{i}', tracker.task, 'fast', f'fast{i}') for i in range(6)]
+    # 慢host的任务还没结束，快host的任务已经全部完成
+    assert [future.result(timeout=5) for future in fast] == [f'fast{i}' for i in range(6)]
+    assert not any(future.done() for future in slow)
+    tracker.release['slow'].set()
+    assert [future.result(timeout=5) for future in slow] == [f'slow{i}' for i in range(6)]
+    pool.close()
+    assert tracker.max_active == {'slow': 1, 'fast': 1}
+    # 同一个host按提交顺序执行
+    assert [name for name in tracker.finished if name.startswith('slow')] == [f'slow{i}' for i in range(6)]
+
+
+def test_download_pool_counts_chunk_slots_against_host_limit():
+    pool = Download_Pool(max_workers=8, max_per_host=3, session=object(), delay=0)
+    assert [pool.host_chunks(chunks) for chunks in [0, 1, 2, 3, 8]] == [1, 1, 2, 3, 3]
+    tracker = Host_Tracker()
+    tracker.release['a'] = threading.Event()
+    futures = [pool.submit('https://a.example.com/video', tracker.task, 'a', 'video0', 2, slots=2)]
+    futures += [pool.submit('https://a.example.com/image', tracker.task, 'a', f'image{i}', slots=1) for i in range(2)]
+    futures.append(pool.submit('https://a.example.com/video', tracker.task, 'a', 'video1', 3, slots=8))
+    time.sleep(0.1)
+    assert pool.host_slots == {'a.example.com': 3}
+    assert [future.done() for future in futures] == [False, False, False, False]
+    tracker.release['a'].set()
+    Download_Pool.wait(futures)
+    pool.close()
+    assert tracker.max_active == {'a': 3}
+    assert pool.host_slots == {'a.example.com': 0}
+    assert pool.pending == {}
+
+
+def test_download_pool_retries_and_releases_slots():
+    pool = Download_Pool(max_workers=2, max_per_host=1, session=object(), tries=3, delay=0)
+    calls = []
+
+    def flaky(name, fail_times):
+        calls.append(name)
+        if calls.count(name) <= fail_times:
+            raise Exception(f'{name} 失败')
+        return name
+    assert pool.submit('https://a.example.com/1', flaky, 'ok', 2).result(timeout=5) == 'ok'
+    assert calls.count('ok') == 3
+    with pytest.raises(Exception, match='bad 失败'):
+        pool.submit('https://a.example.com/2', flaky, 'bad', 5).result(timeout=5)
+    assert calls.count('bad') == 3
+    # 失败的任务也归还了名额，后面的任务能继续执行
+    assert pool.submit('https://a.example.com/3', flaky, 'next', 0).result(timeout=5) == 'next'
+    pool.close()
+    assert pool.host_slots == {'a.example.com': 0}
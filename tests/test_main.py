@@ -0,0 +1,87 @@
+import random
+import threading
+import time
+
+import pytest
+
+from main import Data_Spider
+
+cookies_str = 'a1=test_a1; web_session=test'
+
+
+def note_url(index):
+    return f'https://www.xiaohongshu.com/explore/note{index}?xsec_token=token'
+
+
+def note_card(index):
+    return {
+        'type': 'normal', 'title': f'标题{index}', 'desc': '', 'time': 1700000000000, 'tag_list': [], 'image_list': [],
+        'user': {'user_id': 'u1', 'nickname': '用户', 'avatar': ''},
+        'interact_info': {'liked_count': str(index), 'collected_count': '0', 'comment_count': '0', 'share_count': '0'},
+    }
+
+
+class Stub_Note_Apis():
+    """
+        随机延迟后返回笔记详情，记录每次请求的时间和同时进行的请求数
+        :param fail: 返回失败的笔记序号
+    """
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.times = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def get_note_info(self, url, cookies_str, proxies=None):
+        index = int(url.split('/')[-1].split('?')[0][len('note'):])
+        with self.lock:
+            self.times.append(time.monotonic())
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(random.uniform(0, 0.03))
+        with self.lock:
+            self.active -= 1
+        if index in self.fail:
+            return False, '请求失败', None
+        return True, '成功', {'data': {'items': [{'id': f'note{index}', 'note_card': note_card(index)}]}}
+
+
+@pytest.mark.parametrize('max_workers', [1, 8])
+def test_spider_some_note_keeps_input_order(max_workers):
+    apis = Stub_Note_Apis(fail=[3, 17])
+    spider = Data_Spider(xhs_apis=apis)
+    notes = [note_url(i) for i in range(30)]
+    filtered_list = spider.spider_some_note(notes, cookies_str, {}, '', min_likes=-1, max_workers=max_workers)
+    assert [note['note_id'] for note in filtered_list] == [f'note{i}' for i in range(30) if i not in (3, 17)]
+    if max_workers > 1:
+        assert apis.max_active > 1
+
+
+@pytest.mark.parametrize('max_workers', [1, 8])
+def test_spider_some_note_reports_progress_once_per_note(max_workers):
+    calls = []
+    spider = Data_Spider(xhs_apis=Stub_Note_Apis())
+    notes = [note_url(i) for i in range(25)]
+    spider.spider_some_note(notes, cookies_str, {}, '', progress_callback=lambda progress, msg: calls.append((progress, msg, threading.current_thread())), max_workers=max_workers)
+    # 回调只在调用线程里执行
+    assert {thread for progress, msg, thread in calls} == {threading.current_thread()}
+    calls = [(progress, msg) for progress, msg, thread in calls]
+    note_calls = [call for call in calls if '条笔记...' in call[1]]
+    assert len(note_calls) == len(notes)
+    assert [int(msg.split('/')[0].split(' ')[-1]) for progress, msg in note_calls] == list(range(1, len(notes) + 1))
+    progresses = [progress for progress, msg in calls]
+    assert progresses == sorted(progresses)
+    assert 20 <= progresses[0] and progresses[-1] == 100
+
+
+def test_spider_some_note_rate_limit_is_shared_across_threads():
+    rate_limit = 40
+    apis = Stub_Note_Apis()
+    spider = Data_Spider(xhs_apis=apis)
+    notes = [note_url(i) for i in range(16)]
+    start = time.monotonic()
+    spider.spider_some_note(notes, cookies_str, {}, '', max_workers=8, rate_limit=rate_limit)
+    # 第i个请求最早在开始后 i / rate_limit 秒发出
+    for i, request_time in enumerate(sorted(apis.times)):
+        assert request_time - start >= i / rate_limit - 0.001
@@ -0,0 +1,18 @@
+from xhs_utils.manifest_util import Media_Manifest
+from xhs_utils.sqlite_util import Sqlite_Store
+
+
+def test_manifest_records_media_in_store(tmp_path):
+    store = Sqlite_Store(':memory:')
+    manifest = Media_Manifest(store=store)
+    file_path = str(tmp_path / 'image_0.jpg')
+    with open(file_path, mode='wb') as f:
+        f.write(b'x' * 10)
+    url = 'https://sns-webpic-qc.xhscdn.com/202403211626/abc/110/0/01e5_0.jpg!nd_dft'
+    assert not manifest.is_done('n1', 'image_0', url, file_path)
+    manifest.add('n1', 'image_0', url, file_path)
+    assert manifest.is_done('n1', 'image_0', url.replace('sns-webpic-qc', 'sns-img-bd'), file_path)
+    assert store.query('SELECT note_id, name, url, size FROM media') == [('n1', 'image_0', url, 10)]
+    with open(file_path, mode='ab') as f:
+        f.write(b'y')
+    assert not manifest.is_done('n1', 'image_0', url, file_path)
@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from xhs_utils.parquet_util import Parquet_Sink, save_to_parquet
+
+
+def test_parquet_sink_renames_on_clean_exit(tmp_path):
+    file_path = str(tmp_path / 'notes.parquet')
+    save_to_parquet([{'note_id': 'n1', 'liked_count': '1.2万'}], file_path)
+    assert os.path.exists(file_path)
+    assert not os.path.exists(file_path + '.part')
+
+
+def test_parquet_sink_keeps_part_on_error(tmp_path):
+    file_path = str(tmp_path / 'notes.parquet')
+    with pytest.raises(RuntimeError):
+        with Parquet_Sink(file_path) as sink:
+            sink.write({'note_id': 'n1'})
+            raise RuntimeError('crawl failed')
+    assert not os.path.exists(file_path)
+    assert os.path.exists(file_path + '.part')
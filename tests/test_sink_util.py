@@ -0,0 +1,40 @@
+import csv
+
+from xhs_utils.sink_util import Csv_Sink
+
+
+def make_note(note_id, desc):
+    return {'note_id': note_id, 'title': f'标题{note_id}', 'desc': desc, 'tags': ['a', 'b']}
+
+
+def read_rows(file_path):
+    with open(file_path, mode='r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))
+
+
+def test_csv_sink_repairs_torn_multiline_record(tmp_path):
+    file_path = str(tmp_path / 'notes.csv')
+    with Csv_Sink(file_path) as sink:
+        sink.write(make_note('n1', '第一行\n第二行'))
+        sink.write(make_note('n2', 'a\r\nb'))
+    # 崩溃时写了一半的记录，停在引号里的换行后面
+    with open(file_path, mode='ab') as f:
+        f.write('"",标题n3,"写了一半\n的描述'.encode('utf-8'))
+        f.write(b'\n')
+    with Csv_Sink(file_path) as sink:
+        sink.write(make_note('n4', '续写\n多行'))
+    rows = read_rows(file_path)
+    assert len(rows) == 4
+    assert [row[9] for row in rows[1:]] == ['n1', 'n2', 'n4']
+    assert [row[2] for row in rows[1:]] == ['第一行\n第二行', 'a\r\nb', '续写\n多行']
+
+
+def test_csv_sink_repairs_torn_header(tmp_path):
+    file_path = str(tmp_path / 'notes.csv')
+    with open(file_path, mode='wb') as f:
+        f.write('\ufeff搜索词,标'.encode('utf-8'))
+    with Csv_Sink(file_path) as sink:
+        sink.write(make_note('n1', '多\n行'))
+    rows = read_rows(file_path)
+    assert rows[0][0] == '搜索词'
+    assert rows[1][2] == '多\n行'
@@ -0,0 +1,41 @@
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from xhs_utils import xhs_creator_util
+from xhs_utils.sign_worker import static_path
+
+fixture_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'creator_xs.json')
+with open(fixture_path, mode='r', encoding='utf-8') as f:
+    fixture = json.load(f)
+
+
+@pytest.fixture
+def pinned_time(monkeypatch):
+    monkeypatch.setattr(xhs_creator_util.time, 'time', lambda: fixture['now'] / 1000)
+
+
+@pytest.mark.parametrize('case', fixture['cases'], ids=[case['name'] for case in fixture['cases']])
+def test_creator_sign_matches_js_fixture(pinned_time, case):
+    ret = xhs_creator_util.get_request_headers_params(case['api'], case['data'], fixture['a1'])
+    assert ret == {'xs': case['xs'], 'xt': fixture['now']}
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='需要node')
+def test_creator_sign_matches_js(pinned_time):
+    # 用固定的 Date.now 直接运行 static/xhs_creator_xs.js，js 更新后也能发现不一致
+    script = '''
+        Date.now = () => %d;
+        const fs = require("fs");
+        eval(fs.readFileSync("xhs_creator_xs.js", "utf8"));
+        const input = JSON.parse(fs.readFileSync(0, "utf8"));
+        console.log(JSON.stringify(input.cases.map(c => get_request_headers_params(c.api, c.data, input.a1))));
+    ''' % fixture['now']
+    out = subprocess.run(['node', '-e', script], input=json.dumps(fixture).encode('utf-8'), cwd=static_path,
+                         stdout=subprocess.PIPE, check=True).stdout
+    expected = json.loads(out)
+    for case, ret in zip(fixture['cases'], expected):
+        assert xhs_creator_util.get_request_headers_params(case['api'], case['data'], fixture['a1']) == ret
@@ -0,0 +1,162 @@
+import json
+import threading
+
+import pytest
+
+from apis.xhs_pc_apis import XHS_Apis
+from tests.comment_stub import Comment_Stub, budget_cases
+from xhs_utils.signer import Fake_Signer
+
+cookies_str = 'a1=test_a1; web_session=test'
+note_url = 'https://www.xiaohongshu.com/explore/note1?xsec_token=token'
+
+
+class Counting_Signer(Fake_Signer):
+    def __init__(self):
+        super().__init__()
+        self.batches = []
+        self.singles = 0
+
+    def sign(self, a1, api, data='', method='POST'):
+        self.singles += 1
+        return super().sign(a1, api, data, method)
+
+    def sign_batch(self, requests, a1):
+        self.batches.append(len(requests))
+        return [super(Counting_Signer, self).sign(a1, api, data, method) for api, data, method in requests]
+
+
+class Stub_Response():
+    def __init__(self, res_json):
+        self.res_json = res_json
+
+    def json(self):
+        return self.res_json
+
+
+class Stub_Session():
+    """
+        按请求体里的页码返回 page_fn(page) 的结果，记录每次请求的页码和x-s
+    """
+    def __init__(self, page_fn):
+        self.page_fn = page_fn
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def post(self, url, headers=None, data=None, cookies=None, proxies=None, timeout=None):
+        body = json.loads(data)
+        page = body['page'] if 'page' in body else body['search_user_request']['page']
+        with self.lock:
+            self.requests.append((page, headers['x-s']))
+        return Stub_Response(self.page_fn(page))
+
+
+def note_page(page, total_pages=5, page_size=20):
+    items = [{'id': f'n{(page - 1) * page_size + i}', 'model_type': 'note'} for i in range(page_size)]
+    return {'success': True, 'msg': '成功', 'data': {'items': items, 'has_more': page < total_pages}}
+
+
+def test_search_window_is_signed_in_one_batch():
+    signer = Counting_Signer()
+    session = Stub_Session(note_page)
+    apis = XHS_Apis(signer=signer, session=session)
+    success, msg, notes = apis.search_some_note('旅行', 50, cookies_str, window=3)
+    assert success, msg
+    assert [note['id'] for note in notes] == [f'n{i}' for i in range(50)]
+    assert signer.batches == [3]
+    assert signer.singles == 0
+    assert sorted(page for page, xs in session.requests) == [1, 2, 3]
+    assert len({xs for page, xs in session.requests}) == 3
+
+
+def test_search_user_windows_are_signed_per_window():
+    signer = Counting_Signer()
+    session = Stub_Session(lambda page: {'success': True, 'msg': '成功', 'data': {'users': [{'id': f'u{(page - 1) * 15 + i}'} for i in range(15)], 'has_more': True}})
+    apis = XHS_Apis(signer=signer, session=session)
+    success, msg, users = apis.search_some_user('旅行', 60, cookies_str, window=2)
+    assert success, msg
+    assert len(users) == 60
+    assert signer.batches == [2, 2]
+    assert signer.singles == 0
+
+
+def test_post_batch_reports_sign_failure_for_every_request():
+    class Broken_Signer(Fake_Signer):
+        def sign_batch(self, requests, a1):
+            raise Exception('签名失败')
+    apis = XHS_Apis(signer=Broken_Signer(), session=Stub_Session(note_page))
+    rets = apis.post_batch('/api/sns/web/v1/search/notes', [{'page': 1}, {'page': 2}], cookies_str)
+    assert rets == [(False, '签名失败', None), (False, '签名失败', None)]
+
+
+def stub_fetch_pages(pages_data, windows):
+    """
+        pages_data: {页码: (id列表, has_more)}，windows 记录每次请求的页码
+    """
+    def fetch_pages(pages):
+        windows.append(list(pages))
+        return [(True, '成功', {'data': {'items': [{'id': item_id} for item_id in pages_data[page][0]], 'has_more': pages_data[page][1]}}) for page in pages]
+    return fetch_pages
+
+
+def test_iter_some_page_items_dedupes_across_pages():
+    windows = []
+    pages_data = {1: (['a', 'b', 'c'], True), 2: (['c', 'd', 'a'], True), 3: (['e', 'f', 'g'], True), 4: (['h', 'i', 'j'], True)}
+    items = list(XHS_Apis.iter_some_page_items(stub_fetch_pages(pages_data, windows), 'items', 6, 3, 2))
+    assert [item['id'] for item in items] == ['a', 'b', 'c', 'd', 'e', 'f']
+    # 第一个窗口去重后只有4条，按剩下的2条估算只再取1页
+    assert windows == [[1, 2], [3]]
+
+
+def test_iter_some_page_items_stops_on_has_more_false_inside_window():
+    windows = []
+    pages_data = {1: (['a', 'b'], True), 2: (['c', 'd'], False), 3: (['e', 'f'], True), 4: (['g', 'h'], True)}
+    items = list(XHS_Apis.iter_some_page_items(stub_fetch_pages(pages_data, windows), 'items', 100, 2, 4))
+    assert [item['id'] for item in items] == ['a', 'b', 'c', 'd']
+    assert windows == [[1, 2, 3, 4]]
+
+
+def test_iter_some_page_items_truncates_to_require_num():
+    windows = []
+    pages_data = {page: ([f'{page}_{i}' for i in range(20)], True) for page in range(1, 10)}
+    items = list(XHS_Apis.iter_some_page_items(stub_fetch_pages(pages_data, windows), 'items', 45, 20, 2))
+    assert len(items) == 45
+    assert items[-1]['id'] == '3_4'
+    assert windows == [[1, 2], [3]]
+
+
+def test_iter_some_page_items_raises_on_failed_page():
+    def fetch_pages(pages):
+        return [(True, '成功', {'data': {'items': [{'id': 'a'}], 'has_more': True}}), (False, '请求失败', None)]
+    items = XHS_Apis.iter_some_page_items(fetch_pages, 'items', 10, 1, 2)
+    assert next(items)['id'] == 'a'
+    with pytest.raises(Exception, match='请求失败'):
+        next(items)
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+@pytest.mark.parametrize('stub_kwargs, budget, out_num, inner_num, truncated', budget_cases)
+def test_get_note_some_comment_budget(stub_kwargs, budget, out_num, inner_num, truncated, max_workers):
+    stub = Comment_Stub(**stub_kwargs)
+    apis = XHS_Apis(signer=Fake_Signer())
+    apis.get_note_out_comment = stub.out_comment
+    apis.get_note_inner_comment = stub.inner_comment
+    success, msg, ret = apis.get_note_some_comment(note_url, cookies_str, max_workers=max_workers, **budget)
+    assert success, msg
+    assert len(ret['comments']) == out_num
+    assert [comment['id'] for comment in ret['comments']] == [f'c{i}' for i in range(out_num)]
+    assert all(len(comment['sub_comments']) == inner_num for comment in ret['comments'])
+    assert all(len({sub['id'] for sub in comment['sub_comments']}) == inner_num for comment in ret['comments'])
+    assert ret['truncated'] is truncated
+
+
+@pytest.mark.parametrize('max_num, sub_num, truncated', [(None, 12, False), (9, 12, False), (8, 11, True), (5, 8, True), (0, 3, True)])
+def test_get_note_some_inner_comment_budget(max_num, sub_num, truncated):
+    stub = Comment_Stub()
+    apis = XHS_Apis(signer=Fake_Signer())
+    apis.get_note_inner_comment = stub.inner_comment
+    comment = stub.out_comment('n', '', '', '')[2]['data']['comments'][0]
+    success, msg, inner_truncated = apis.get_note_some_inner_comment(comment, 'token', cookies_str, max_num=max_num)
+    assert success, msg
+    assert len(comment['sub_comments']) == sub_num
+    assert inner_truncated is truncated
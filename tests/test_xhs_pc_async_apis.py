@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from apis.xhs_pc_async_apis import AsyncXHS_Apis
+from tests.comment_stub import Comment_Stub, budget_cases
+from xhs_utils.signer import Fake_Signer
+
+cookies_str = 'a1=test_a1; web_session=test'
+note_url = 'https://www.xiaohongshu.com/explore/note1?xsec_token=token'
+
+
+def async_stub(fn):
+    async def call(*args, **kwargs):
+        await asyncio.sleep(0)
+        return fn(*args, **kwargs)
+    return call
+
+
+@pytest.mark.parametrize('max_workers', [1, 4])
+@pytest.mark.parametrize('stub_kwargs, budget, out_num, inner_num, truncated', budget_cases)
+def test_get_note_some_comment_budget(stub_kwargs, budget, out_num, inner_num, truncated, max_workers):
+    async def run():
+        stub = Comment_Stub(**stub_kwargs)
+        async with AsyncXHS_Apis(signer=Fake_Signer()) as apis:
+            apis.get_note_out_comment = async_stub(stub.out_comment)
+            apis.get_note_inner_comment = async_stub(stub.inner_comment)
+            return await apis.get_note_some_comment(note_url, cookies_str, max_workers=max_workers, **budget)
+    success, msg, ret = asyncio.run(run())
+    assert success, msg
+    assert [comment['id'] for comment in ret['comments']] == [f'c{i}' for i in range(out_num)]
+    assert all(len(comment['sub_comments']) == inner_num for comment in ret['comments'])
+    assert ret['truncated'] is truncated
@@ -1,22 +1,39 @@
 import json
 import os
 import re
+import threading
 import time
-import openpyxl
-import requests
 from loguru import logger
-from retry import retry
+from xhs_utils.download_util import Download_Pool, download_file, download_timeout
+from xhs_utils.http_util import create_session
+from xhs_utils.xlsx_util import EXCEL_MAX_ROWS, Xlsx_Writer, norm_text, xlsx_headers, xlsx_row
+
+# 下载媒体共用的连接池，避免每张图片都重新建立tls连接
+media_session = create_session()
+# 多个笔记共用的下载线程池，限制总并发和每个host的并发
+media_download_pool = Download_Pool()
+# 已下载完成的媒体清单，第一次下载时创建
+media_manifest = None
+media_manifest_lock = threading.Lock()
+
+
+def get_media_manifest():
+    global media_manifest
+    # manifest_util 依赖的 sqlite_util 用到了本模块的 parse_number，在这里导入避免循环导入
+    from xhs_utils.manifest_util import Media_Manifest
+    with media_manifest_lock:
+        if media_manifest is None:
+            media_manifest = Media_Manifest()
+        return media_manifest
+
+
+ILLEGAL_PATH_RE = re.compile(r"|[\\/:*?\"<>| ]+")
 
 
 def norm_str(str):
-    new_str = re.sub(r"|[\\/:*?\"<>| ]+", "", str).replace('\n', '').replace('\r', '')
+    new_str = ILLEGAL_PATH_RE.sub("", str).replace('\n', '').replace('\r', '')
     return new_str
 
-def norm_text(text):
-    ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
-    text = ILLEGAL_CHARACTERS_RE.sub(r'', text)
-    return text
-
 
 def timestamp_to_str(timestamp):
     time_local = time.localtime(timestamp / 1000)
@@ -92,6 +109,45 @@ def parse_number(num_str):
         return 0
 
 
+def parse_number_upper(num_str):
+    """
+    返回字符串格式数字可能的最大值，如 '2.7万' 实际在 27000 到 27999 之间，返回 27999
+    '10万+' 这样带 + 的或者无法解析的返回无穷大
+    """
+    if isinstance(num_str, int):
+        return num_str
+    if not isinstance(num_str, str):
+        return float('inf')
+    num_str = num_str.strip()
+    if '+' in num_str:
+        return float('inf')
+    digits, scale = num_str, 1
+    for unit, unit_scale in (('万', 10000), ('千', 1000)):
+        if unit in num_str:
+            digits, scale = num_str.replace(unit, ''), unit_scale
+            break
+    try:
+        value = float(digits)
+    except ValueError:
+        return float('inf')
+    decimals = len(digits.split('.')[1]) if '.' in digits else 0
+    return round(value * scale) + max(scale // (10 ** decimals), 1) - 1
+
+
+def search_note_may_pass(note, min_likes, min_collects):
+    """
+    根据搜索结果中 note_card.interact_info 的互动数据判断笔记是否可能满足阈值
+    阈值是 点赞数 > min_likes 或 收藏数 > min_collects，只要缺少其中一个字段就视为可能满足
+    搜索结果通常只有点赞数，这时不会筛掉任何笔记，只有两个字段都在且都不满足时才筛掉
+    """
+    interact_info = note.get('note_card', {}).get('interact_info', {})
+    liked_count = interact_info.get('liked_count')
+    collected_count = interact_info.get('collected_count')
+    if liked_count is None or collected_count is None:
+        return True
+    return parse_number_upper(liked_count) > min_likes or parse_number_upper(collected_count) > min_collects
+
+
 def handle_note_info(data):
     note_id = data['id']
     note_url = data['url']
@@ -214,61 +270,44 @@ def handle_comment_info(data):
         'ip_location': ip_location,
         'pictures': pictures,
     }
-def save_to_xlsx(datas, file_path, type='note', search_query=''):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    if type == 'note':
-        # 按照用户要求的列顺序：搜索词, 标题, 描述, 标签, 点赞数量, 收藏数量, 评论数量, 分享数量, 笔记url, 笔记id, 用户id, 用户主页url, 昵称, 头像url, 图片地址url列表, 视频封面url, 视频地址url, 上传时间, ip归属地
-        headers = ['搜索词', '标题', '描述', '标签', '点赞数量', '收藏数量', '评论数量', '分享数量', '笔记url', '笔记id', '用户id', '用户主页url', '昵称', '头像url', '图片地址url列表', '视频封面url', '视频地址url', '上传时间', 'ip归属地']
-    elif type == 'user':
-        headers = ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签']
-    else:
-        headers = ['笔记id', '笔记url', '评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表']
-    ws.append(headers)
-    for data in datas:
-        data = {k: norm_text(str(v)) for k, v in data.items()}
-        if type == 'note':
-            # 按照新的列顺序构建数据行
-            row_data = [
-                search_query,  # 搜索词
-                data.get('title', ''),  # 标题
-                data.get('desc', ''),  # 描述
-                str(data.get('tags', [])),  # 标签
-                data.get('liked_count', 0),  # 点赞数量
-                data.get('collected_count', 0),  # 收藏数量
-                data.get('comment_count', 0),  # 评论数量
-                data.get('share_count', 0),  # 分享数量
-                data.get('note_url', ''),  # 笔记url
-                data.get('note_id', ''),  # 笔记id
-                data.get('user_id', ''),  # 用户id
-                data.get('home_url', ''),  # 用户主页url
-                data.get('nickname', ''),  # 昵称
-                data.get('avatar', ''),  # 头像url
-                str(data.get('image_list', [])),  # 图片地址url列表
-                data.get('video_cover', ''),  # 视频封面url
-                data.get('video_addr', ''),  # 视频地址url
-                data.get('upload_time', ''),  # 上传时间
-                data.get('ip_location', '')  # ip归属地
-            ]
-            ws.append(row_data)
-        else:
-            ws.append(list(data.values()))
-    wb.save(file_path)
-    logger.info(f'数据保存至 {file_path}')
+def save_to_xlsx(datas, file_path, type='note', search_query='', max_rows=EXCEL_MAX_ROWS - 1, split='sheet'):
+    """
+        流式保存到excel，datas 可以是列表也可以是生成器，内存占用不随行数增长
+        :param max_rows: 每个sheet最多的数据行数，超出时按 split 换到新的sheet或新的文件
+        返回写入的全部文件路径
+    """
+    with Xlsx_Writer(file_path, xlsx_headers(type), max_rows, split) as writer:
+        for data in datas:
+            writer.append(xlsx_row(data, type, search_query))
+    return writer.file_paths
+
+def media_file_name(name, type):
+    return name + ('.mp4' if type == 'video' else '.jpg')
 
-def download_media(path, name, url, type):
+
+def download_media(path, name, url, type, session=None, chunks=1, timeout=download_timeout):
+    """
+        流式下载图片或视频，先写临时文件再原子重命名，中断后再次调用会用Range请求续传
+        :param chunks: 视频分段并发下载的段数，1 为不分段
+        :param timeout: 请求超时时间（秒），可为 (连接超时, 读取超时)
+    """
+    session = session or media_session
     if type == 'image':
-        content = requests.get(url).content
-        with open(path + '/' + name + '.jpg', mode="wb") as f:
-            f.write(content)
+        download_file(session, url, path + '/' + media_file_name(name, type), chunk_size=64 * 1024, timeout=timeout)
     elif type == 'video':
-        res = requests.get(url, stream=True)
-        size = 0
-        chunk_size = 1024 * 1024
-        with open(path + '/' + name + '.mp4', mode="wb") as f:
-            for data in res.iter_content(chunk_size=chunk_size):
-                f.write(data)
-                size += len(data)
+        download_file(session, url, path + '/' + media_file_name(name, type), chunks=chunks, timeout=timeout)
+
+
+def download_note_media(manifest, note_id, path, name, url, type, session=None, chunks=1, media_store=None, timeout=download_timeout):
+    """
+        下载笔记的一个媒体，下载完成后记入清单
+        :param media_store: 内容寻址的媒体存储，不为空时同一个文件只下载一次，笔记目录里是它的硬链接
+    """
+    if media_store is not None:
+        media_store.save(url, path + '/' + media_file_name(name, type), session or media_session, chunks, timeout)
+    else:
+        download_media(path, name, url, type, session, chunks, timeout)
+    manifest.add(note_id, name, url, path + '/' + media_file_name(name, type))
 
 def save_user_detail(user, path):
     with open(f'{path}/detail.txt', mode="w", encoding="utf-8") as f:
@@ -311,8 +350,17 @@ def save_note_detail(note, path):
 
 
 
-@retry(tries=3, delay=1)
-def download_note(note_info, path, save_choice):
+def submit_download_note(note_info, path, save_choice, download_pool=None, video_chunks=1, manifest=None, media_store=None):
+    """
+        保存笔记信息，并把清单里没有下载完整的图片和视频提交到下载线程池
+        :param download_pool: 下载线程池，默认为多个笔记共用的 media_download_pool
+        :param video_chunks: 视频分段并发下载的段数，1 为不分段，不超过下载线程池每个host的并发上限
+        :param manifest: 已下载媒体的清单，默认记录在 datas/xhs.db 的 media 表
+        :param media_store: 内容寻址的媒体存储 Media_Store，不为空时跨笔记去重，为空时每个笔记单独保存
+        返回 (保存路径, 下载任务列表)
+    """
+    download_pool = download_pool or media_download_pool
+    manifest = manifest or get_media_manifest()
     note_id = note_info['note_id']
     user_id = note_info['user_id']
     title = note_info['title']
@@ -327,15 +375,67 @@ def download_note(note_info, path, save_choice):
         f.write(json.dumps(note_info) + '\n')
     note_type = note_info['note_type']
     save_note_detail(note_info, save_path)
+    medias = []
     if note_type == '图集' and save_choice in ['media', 'media-image', 'all']:
         for img_index, img_url in enumerate(note_info['image_list']):
-            download_media(save_path, f'image_{img_index}', img_url, 'image')
+            medias.append((f'image_{img_index}', img_url, 'image'))
     elif note_type == '视频' and save_choice in ['media', 'media-video', 'all']:
-        download_media(save_path, 'cover', note_info['video_cover'], 'image')
-        download_media(save_path, 'video', note_info['video_addr'], 'video')
+        medias.append(('cover', note_info['video_cover'], 'image'))
+        medias.append(('video', note_info['video_addr'], 'video'))
+    # 分段下载的每一段都占用一个host名额，段数不超过每个host的并发上限
+    video_chunks = download_pool.host_chunks(video_chunks)
+    futures = []
+    for name, url, type in medias:
+        if manifest.is_done(note_id, name, url, f'{save_path}/{media_file_name(name, type)}'):
+            continue
+        slots = video_chunks if type == 'video' else 1
+        futures.append(download_pool.submit(url, download_note_media, manifest, note_id, save_path, name, url, type, download_pool.session, video_chunks, media_store, download_pool.timeout, slots=slots))
+    return save_path, futures
+
+
+def download_note(note_info, path, save_choice, download_pool=None, video_chunks=1, manifest=None, media_store=None):
+    """
+        下载一个笔记，笔记的图片和视频并发下载
+        :param download_pool: 下载线程池，默认为多个笔记共用的 media_download_pool
+        :param video_chunks: 视频分段并发下载的段数，1 为不分段
+        :param manifest: 已下载媒体的清单，已下载完整的文件跳过，默认记录在 datas/xhs.db 的 media 表
+        :param media_store: 内容寻址的媒体存储 Media_Store，不为空时跨笔记去重，为空时每个笔记单独保存
+        返回保存路径
+    """
+    save_path, futures = submit_download_note(note_info, path, save_choice, download_pool, video_chunks, manifest, media_store)
+    Download_Pool.wait(futures)
     return save_path
 
 
+def download_notes(note_infos, path, save_choice, download_pool=None, video_chunks=1, manifest=None, media_store=None):
+    """
+        下载多个笔记，所有笔记的图片和视频一起提交到下载线程池并发下载
+        某个文件下载失败不影响其它笔记，失败的笔记在返回值里列出，重新运行时已下载完整的文件会跳过
+        :param download_pool: 下载线程池，默认为多个笔记共用的 media_download_pool
+        :param video_chunks: 视频分段并发下载的段数，1 为不分段
+        :param manifest: 已下载媒体的清单，已下载完整的文件跳过，默认记录在 datas/xhs.db 的 media 表
+        :param media_store: 内容寻址的媒体存储 Media_Store，不为空时跨笔记去重，为空时每个笔记单独保存
+        返回 (全部文件都下载成功的笔记的保存路径列表, 下载失败的笔记 [(笔记id, 错误信息)])
+    """
+    submitted = []
+    failed_notes = []
+    for note_info in note_infos:
+        try:
+            submitted.append((note_info['note_id'], *submit_download_note(note_info, path, save_choice, download_pool, video_chunks, manifest, media_store)))
+        except Exception as e:
+            logger.error(f'保存笔记 {note_info["note_id"]} 失败: {e}')
+            failed_notes.append((note_info['note_id'], str(e)))
+    save_paths = []
+    for note_id, save_path, futures in submitted:
+        try:
+            Download_Pool.wait(futures)
+            save_paths.append(save_path)
+        except Exception as e:
+            logger.error(f'下载笔记 {save_path} 失败: {e}')
+            failed_notes.append((note_id, str(e)))
+    return save_paths, failed_notes
+
+
 def check_and_create_path(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
+    # 多个线程可能同时创建同一个目录
+    os.makedirs(path, exist_ok=True)
@@ -0,0 +1,272 @@
+import os
+import re
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from loguru import logger
+from retry.api import retry_call
+from xhs_utils.http_util import create_session
+
+# 断点续传用的临时文件后缀，下载完成后原子重命名为正式文件
+part_suffix = '.part'
+# 记录临时文件首次下载时的 ETag/Last-Modified，续传时作为 If-Range
+validator_suffix = '.validator'
+# 默认的 (连接超时, 读取超时) 秒数，连接卡住时抛出异常交给重试，不会一直占着host的名额
+download_timeout = (10, 60)
+
+
+def parse_content_range(value: str):
+    """
+        解析 Content-Range 响应头，如 bytes 0-99/1000 或 416 时的 bytes */1000
+        返回 (起始位置, 结束位置, 文件大小)，没有的部分为None，格式不对时返回None
+    """
+    match = re.fullmatch(r'bytes (?:(\d+)-(\d+)|\*)/(\d+|\*)', (value or '').strip())
+    if not match:
+        return None
+    start, end, total = match.groups()
+    return (None if start is None else int(start), None if end is None else int(end), None if total == '*' else int(total))
+
+
+def get_validator(res):
+    """
+        取响应里可用于 If-Range 的校验值，优先用强ETag，其次用Last-Modified，都没有时返回None
+    """
+    etag = res.headers.get('ETag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return res.headers.get('Last-Modified')
+
+
+def remove_part(file_path: str):
+    """
+        删除临时文件和记录校验值的文件
+    """
+    for path in [file_path, file_path + validator_suffix]:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def stream_download(session, url: str, file_path: str, chunk_size: int = 1024 * 1024, start: int = 0, end: int = None, timeout=download_timeout):
+    """
+        流式下载到 file_path，已存在的部分用Range请求续传，不会把整个文件读进内存
+        续传时带上首次下载记录的 ETag/Last-Modified 作为 If-Range，服务端文件变了会返回完整文件，从头下载
+        :param session: requests.Session
+        :param start: 要下载的范围在原文件中的起始位置，file_path 里已有的字节从这里往后算
+        :param end: 要下载的范围的结束位置（包含），为空则下载到文件末尾
+        :param timeout: 请求超时时间（秒），可为 (连接超时, 读取超时)，读取超时是两次收到数据之间的最长间隔
+        下载不完整时抛出异常，已下载的部分保留在 file_path 里供下次续传
+        服务端返回的范围和已下载的部分对不上时删除 file_path 后抛出异常，下次从头下载
+    """
+    done = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+    if end is not None and start + done > end:
+        if start + done == end + 1:
+            return
+        # 已下载的部分比要下载的范围还长，不是这个范围留下的文件
+        remove_part(file_path)
+        done = 0
+    headers = {}
+    if start + done > 0 or end is not None:
+        headers['Range'] = f'bytes={start + done}-{"" if end is None else end}'
+    validator_path = file_path + validator_suffix
+    if done and os.path.exists(validator_path):
+        with open(validator_path, mode='r', encoding='utf-8') as f:
+            headers['If-Range'] = f.read()
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as res:
+        if res.status_code == 416:
+            content_range = parse_content_range(res.headers.get('Content-Range'))
+            total = content_range[2] if content_range else None
+            if end is None and total is not None and start + done == total:
+                # 已经下载完整
+                return
+            if done:
+                # 已下载的部分和服务端的文件对不上，删掉从头下载
+                logger.warning(f'{url} 已下载 {start + done} 字节，服务端文件大小为 {total}，重新下载')
+                remove_part(file_path)
+                return stream_download(session, url, file_path, chunk_size, start, end, timeout)
+        res.raise_for_status()
+        if headers and res.status_code != 206:
+            # 服务端忽略了Range或者文件已经变了，已下载的部分不能再用
+            remove_part(file_path)
+            if start > 0 or end is not None:
+                raise Exception(f'{url} 不支持Range请求')
+            done = 0
+        elif res.status_code == 206:
+            content_range = parse_content_range(res.headers.get('Content-Range'))
+            if content_range is None or content_range[0] != start + done:
+                remove_part(file_path)
+                raise Exception(f'{url} Content-Range {res.headers.get("Content-Range")} 与请求的起始位置 {start + done} 不一致')
+            range_start, range_end, total = content_range
+            if total is not None and range_end != (total - 1 if end is None else end):
+                remove_part(file_path)
+                raise Exception(f'{url} Content-Range {res.headers.get("Content-Range")} 与请求的范围 {start + done}-{"" if end is None else end} 不一致')
+        if not done:
+            validator = get_validator(res)
+            if validator:
+                with open(validator_path, mode='w', encoding='utf-8') as f:
+                    f.write(validator)
+            elif os.path.exists(validator_path):
+                os.remove(validator_path)
+        expected = res.headers.get('Content-Length')
+        if res.status_code == 206:
+            # 没有Content-Length时按Content-Range检查收到的字节数
+            expected = content_range[1] - content_range[0] + 1
+        received = 0
+        with open(file_path, mode='ab' if done else 'wb') as f:
+            for data in res.iter_content(chunk_size=chunk_size):
+                f.write(data)
+                received += len(data)
+    if expected is not None and received < int(expected):
+        raise Exception(f'{url} 下载不完整 {received}/{expected}')
+
+
+def get_content_length(session, url: str, timeout=download_timeout):
+    """
+        用Range请求第一个字节获取文件大小
+        返回文件大小，服务端不支持Range请求时返回None
+    """
+    with session.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout) as res:
+        res.raise_for_status()
+        content_range = parse_content_range(res.headers.get('Content-Range'))
+        if res.status_code != 206 or content_range is None or content_range[0] != 0:
+            return None
+        return content_range[2]
+
+
+def download_file(session, url: str, file_path: str, chunks: int = 1, min_chunk_size: int = 8 * 1024 * 1024, chunk_size: int = 1024 * 1024, timeout=download_timeout):
+    """
+        下载文件，先写到 file_path.part，完整后原子重命名为 file_path，中断后再次调用会续传
+        :param session: requests.Session
+        :param chunks: 大于1时把大文件切成多段并发下载，每段单独续传
+        :param min_chunk_size: 每段的最小字节数，文件小于 2 * min_chunk_size 时不分段
+        :param timeout: 请求超时时间（秒），可为 (连接超时, 读取超时)
+    """
+    part_path = file_path + part_suffix
+    size = None
+    if chunks > 1:
+        size = get_content_length(session, url, timeout)
+    if size is None or size < 2 * min_chunk_size:
+        stream_download(session, url, part_path, chunk_size, timeout=timeout)
+    else:
+        chunks = min(chunks, size // min_chunk_size)
+        step = -(-size // chunks)
+        ranges = [(i, i * step, min((i + 1) * step, size) - 1) for i in range(chunks)]
+        with ThreadPoolExecutor(max_workers=chunks) as executor:
+            futures = [executor.submit(stream_download, session, url, f'{part_path}{i}', chunk_size, start, end, timeout) for i, start, end in ranges]
+            for future in futures:
+                future.result()
+        with open(part_path, mode='wb') as f:
+            for i, start, end in ranges:
+                with open(f'{part_path}{i}', mode='rb') as chunk_file:
+                    while True:
+                        data = chunk_file.read(chunk_size)
+                        if not data:
+                            break
+                        f.write(data)
+        for i, start, end in ranges:
+            remove_part(f'{part_path}{i}')
+        if os.path.getsize(part_path) != size:
+            # 分段都删掉，下次重新下载，不再合并同样的坏数据
+            remove_part(part_path)
+            raise Exception(f'{url} 分段下载大小不一致')
+    if os.path.exists(part_path + validator_suffix):
+        os.remove(part_path + validator_suffix)
+    os.replace(part_path, file_path)
+
+
+class Download_Pool():
+    """
+        多个笔记共用的下载线程池，线程安全
+        总并发数由 max_workers 限制，同一个host的并发连接数由 max_per_host 限制，分段下载的每一段都占一个名额
+        :param max_workers: 最多同时下载的文件数
+        :param max_per_host: 每个host最多同时下载的连接数
+        :param session: 下载用的requests.Session，不传则按 max_per_host 创建连接池
+        :param tries: 每个文件最多尝试的次数
+        :param delay: 失败后重试的间隔秒数
+        :param timeout: 下载请求的超时时间（秒），可为 (连接超时, 读取超时)，超时按失败重试
+    """
+    def __init__(self, max_workers: int = 8, max_per_host: int = 4, session=None, tries: int = 3, delay: float = 1, timeout=download_timeout):
+        self.max_workers = max_workers
+        self.max_per_host = max_per_host
+        self.session = session or create_session(pool_maxsize=max_per_host)
+        self.tries = tries
+        self.delay = delay
+        self.timeout = timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='xhs_download')
+        self.host_slots = {}
+        # 每个host等待名额的任务队列 (future, fn, args, slots)
+        self.pending = {}
+        self.condition = threading.Condition()
+
+    def host_chunks(self, chunks: int):
+        """
+            分段下载的段数不能超过每个host的名额
+        """
+        return max(min(chunks, self.max_per_host), 1)
+
+    def dispatch(self, host: str):
+        # 调用时已持有 self.condition，按提交顺序把名额够用的任务交给线程池
+        # 排队的任务不占线程，一个host满了不会让其它host的任务等着
+        queue = self.pending.get(host)
+        while queue and self.host_slots.get(host, 0) + queue[0][3] <= self.max_per_host:
+            future, fn, args, slots = queue.popleft()
+            self.host_slots[host] = self.host_slots.get(host, 0) + slots
+            self.executor.submit(self.run, host, future, fn, args, slots)
+        if not queue:
+            self.pending.pop(host, None)
+
+    def run(self, host: str, future: Future, fn, args, slots: int):
+        if not future.set_running_or_notify_cancel():
+            result, error = None, None
+        else:
+            try:
+                result, error = retry_call(fn, args, tries=self.tries, delay=self.delay), None
+            except Exception as e:
+                result, error = None, e
+        # 先归还名额再通知调用方，任务结束后名额一定已经可用
+        with self.condition:
+            self.host_slots[host] -= slots
+            self.dispatch(host)
+            self.condition.notify_all()
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def submit(self, url: str, fn, *args, slots: int = 1):
+        """
+            提交一个下载任务，fn(*args) 在占用url所在host的 slots 个名额时执行，失败按 tries 重试
+            名额不够时任务在该host的队列里排队，不占用线程池的线程
+            :param slots: 任务同时使用的连接数，分段下载时为段数，超过 max_per_host 时按 max_per_host 计
+            返回 concurrent.futures.Future
+        """
+        host = urllib.parse.urlparse(url).netloc
+        future = Future()
+        with self.condition:
+            self.pending.setdefault(host, deque()).append((future, fn, args, self.host_chunks(slots)))
+            self.dispatch(host)
+        return future
+
+    @staticmethod
+    def wait(futures):
+        """
+            等待一组下载任务全部结束，有失败的任务时在全部结束后抛出第一个异常
+        """
+        error = None
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f'下载失败: {e}')
+                error = error or e
+        if error is not None:
+            raise error
+
+    def close(self):
+        # 排队的任务要等前面的任务归还名额后才会提交到线程池
+        with self.condition:
+            self.condition.wait_for(lambda: not self.pending)
+        self.executor.shutdown(wait=True)
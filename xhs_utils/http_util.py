@@ -0,0 +1,25 @@
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False, max_retries: int = 0, keep_alive: bool = True):
+    """
+        创建带连接池的session，复用tcp和tls连接
+        :param pool_connections: 缓存连接池的host数量
+        :param pool_maxsize: 每个host最多保持的连接数
+        :param pool_block: 为True时每个host的连接数严格不超过pool_maxsize，超出的请求等待空闲连接
+        :param max_retries: 连接失败的重试次数
+        :param keep_alive: 是否保持长连接
+        返回 requests.Session
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries, pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    # cookies由每次请求传入，不在session里保存服务端返回的cookie，避免多账号之间串号
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
@@ -0,0 +1,52 @@
+import os
+import urllib.parse
+
+from xhs_utils.sqlite_util import Sqlite_Store, sqlite_path
+
+
+def url_key(url: str):
+    """
+        媒体url去掉域名和参数后的部分，同一个文件换了cdn域名或签名参数也能对上
+    """
+    return urllib.parse.urlparse(url).path
+
+
+class Media_Manifest():
+    """
+        已下载完成的媒体清单，记录在 Sqlite_Store 的 media 表里，和笔记、评论在同一个库，线程安全
+        按 (笔记id, 媒体名) 记录url、保存路径和字节数，重新运行时跳过已经下载完整的文件
+        :param path: sqlite文件路径，默认 datas/xhs.db，传入 ':memory:' 则只在本次运行内有效
+        :param store: 已经打开的 Sqlite_Store，不为空时忽略 path，和笔记数据共用一个连接
+    """
+    def __init__(self, path: str = sqlite_path, store: Sqlite_Store = None):
+        self.own_store = store is None
+        self.store = store or Sqlite_Store(path)
+
+    def get(self, note_id: str, name: str):
+        """
+            返回 {'url_key', 'path', 'size'}，没有记录返回None
+        """
+        rows = self.store.query('SELECT url_key, path, size FROM media WHERE note_id = ? AND name = ?', (note_id, name))
+        if not rows:
+            return None
+        return {'url_key': rows[0][0], 'path': rows[0][1], 'size': rows[0][2]}
+
+    def is_done(self, note_id: str, name: str, url: str, path: str):
+        """
+            判断媒体是否已经下载完整：有记录，url和路径一致，并且文件还在、大小没变
+        """
+        record = self.get(note_id, name)
+        if record is None or record['url_key'] != url_key(url) or record['path'] != os.path.abspath(path):
+            return False
+        return os.path.isfile(path) and os.path.getsize(path) == record['size']
+
+    def add(self, note_id: str, name: str, url: str, path: str):
+        """
+            记录一个下载完成的媒体，字节数取文件当前的大小
+        """
+        self.store.upsert_media([{'note_id': note_id, 'name': name, 'url': url, 'url_key': url_key(url),
+                                  'path': os.path.abspath(path), 'size': os.path.getsize(path)}])
+
+    def close(self):
+        if self.own_store:
+            self.store.close()
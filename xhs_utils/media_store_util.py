@@ -0,0 +1,84 @@
+import os
+import re
+import shutil
+import threading
+import urllib.parse
+
+from xhs_utils.download_util import download_file, download_timeout
+
+media_store_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/media_store'))
+
+
+def media_key(url: str):
+    """
+        从媒体url中提取稳定的文件key，与 XHS_Apis.get_note_no_water_img 的解析方式一致
+        同一张图片在不同笔记、不同cdn域名和签名下得到相同的key
+    """
+    path = urllib.parse.urlparse(url).path
+    # https://sns-webpic-qc.xhscdn.com/202403211626/c4fcecea4bd012a1fe8d2f1968d6aa91/110/0/01e50c1c135e8c010010000000018ab74db332_0.jpg!nd_dft_wlteh_webp_3
+    if '.jpg' in path:
+        key = '/'.join(path.split('/')[-3:]).split('!')[0]
+    # https://sns-webpic-qc.xhscdn.com/202403231640/ea961053c4e0e467df1cc93afdabd630/spectrum/1000g0k0200n7mj8fq0005n7ikbllol6q50oniuo!nd_dft_wgth_webp_3
+    elif 'spectrum' in path:
+        key = '/'.join(path.split('/')[-2:]).split('!')[0]
+    # https://sns-video-bd.xhscdn.com/stream/110/258/01e5d3f3c4d3a5d7010370038c0e7b6b1d_258.mp4
+    elif 'video' in urllib.parse.urlparse(url).netloc:
+        key = path.lstrip('/')
+    # http://sns-webpic-qc.xhscdn.com/202403181511/64ad2ea67ce04159170c686a941354f5/1040g008310cs1hii6g6g5ngacg208q5rlf1gld8!nd_dft_wlteh_webp_3
+    else:
+        key = path.split('/')[-1].split('!')[0]
+    return re.sub(r'[^0-9A-Za-z._-]+', '_', key).strip('._') or 'empty'
+
+
+class Media_Store():
+    """
+        按媒体key去重的内容寻址存储，线程安全
+        每个文件只下载一次保存在 root 下，笔记目录里的文件是指向它的硬链接，不支持硬链接时退回复制
+        :param root: 存储目录，默认 datas/media_store，需要和笔记目录在同一个文件系统上才能硬链接
+    """
+    def __init__(self, root: str = media_store_path):
+        self.root = root
+        self.key_locks = {}
+        self.lock = threading.Lock()
+
+    def key_lock(self, key: str):
+        with self.lock:
+            if key not in self.key_locks:
+                self.key_locks[key] = threading.Lock()
+            return self.key_locks[key]
+
+    def store_path(self, key: str, ext: str):
+        return os.path.join(self.root, key[:2], key if key.endswith(ext) else key + ext)
+
+    def fetch(self, url: str, ext: str, session, chunks: int = 1, timeout=download_timeout):
+        """
+            确保url对应的文件在存储里，已经存在时不发起任何请求，同一个key同时只会下载一次
+            返回存储里的文件路径
+        """
+        key = media_key(url)
+        file_path = self.store_path(key, ext)
+        with self.key_lock(key):
+            if not os.path.isfile(file_path):
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                download_file(session, url, file_path, chunks=chunks, timeout=timeout)
+        return file_path
+
+    @staticmethod
+    def link(src: str, dst: str):
+        """
+            把存储里的文件硬链接到 dst，先链接到临时文件再原子替换
+        """
+        if os.path.isfile(dst) and os.path.samefile(src, dst):
+            return
+        tmp = f'{dst}.link.{threading.get_ident()}'
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+
+    def save(self, url: str, dst: str, session, chunks: int = 1, timeout=download_timeout):
+        """
+            下载（或复用已存储的）媒体并链接到 dst
+        """
+        self.link(self.fetch(url, os.path.splitext(dst)[1], session, chunks, timeout), dst)
@@ -0,0 +1,120 @@
+import datetime
+import os
+
+from xhs_utils.data_util import parse_number
+from xhs_utils.sink_util import Sink
+
+# 列类型：str 字符串, dict 字典编码的字符串, int 整数, time 时间, list 字符串列表
+note_columns = [
+    ('note_id', 'str'), ('note_url', 'str'), ('note_type', 'dict'), ('user_id', 'str'), ('home_url', 'str'),
+    ('nickname', 'dict'), ('avatar', 'str'), ('title', 'str'), ('desc', 'str'),
+    ('liked_count', 'int'), ('collected_count', 'int'), ('comment_count', 'int'), ('share_count', 'int'),
+    ('video_cover', 'str'), ('video_addr', 'str'), ('image_list', 'list'), ('tags', 'list'),
+    ('upload_time', 'time'), ('ip_location', 'dict'),
+]
+user_columns = [
+    ('user_id', 'str'), ('home_url', 'str'), ('nickname', 'dict'), ('avatar', 'str'), ('red_id', 'str'),
+    ('gender', 'dict'), ('ip_location', 'dict'), ('desc', 'str'),
+    ('follows', 'int'), ('fans', 'int'), ('interaction', 'int'), ('tags', 'list'),
+]
+comment_columns = [
+    ('note_id', 'str'), ('note_url', 'str'), ('comment_id', 'str'), ('user_id', 'str'), ('home_url', 'str'),
+    ('nickname', 'dict'), ('avatar', 'str'), ('content', 'str'), ('show_tags', 'list'),
+    ('like_count', 'int'), ('upload_time', 'time'), ('ip_location', 'dict'), ('pictures', 'list'),
+]
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('导出parquet需要安装pyarrow: pip install pyarrow')
+    return pyarrow
+
+
+def parquet_columns(type='note'):
+    if type == 'note':
+        return note_columns
+    elif type == 'user':
+        return user_columns
+    return comment_columns
+
+
+def parquet_schema(type='note'):
+    pa = import_pyarrow()
+    kinds = {
+        'str': pa.string(),
+        'dict': pa.dictionary(pa.int32(), pa.string()),
+        'int': pa.int64(),
+        'time': pa.timestamp('ms'),
+        'list': pa.list_(pa.string()),
+    }
+    return pa.schema([(name, kinds[kind]) for name, kind in parquet_columns(type)])
+
+
+def to_time(value):
+    """
+        timestamp_to_str 得到的本地时间字符串或毫秒时间戳转成datetime
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value / 1000)
+    return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+
+
+def to_column(values, kind):
+    if kind == 'int':
+        return [None if value is None else parse_number(value) for value in values]
+    elif kind == 'time':
+        return [to_time(value) for value in values]
+    elif kind == 'list':
+        return [None if value is None else [str(item) for item in value] for value in values]
+    return [None if value is None else str(value) for value in values]
+
+
+class Parquet_Sink(Sink):
+    """
+        按列类型导出parquet，点赞数等为整数，上传时间为时间戳，标签和图片为字符串列表，昵称和ip归属地字典编码
+        每 row_group_size 条写成一个row group，先写 file_path.part，close时写完文件尾再原子重命名
+        出错退出with块时不重命名，已写入的row group留在 file_path.part 里
+        需要另外安装pyarrow: pip install pyarrow
+        :param file_path: 保存路径
+        :param type: note / user / comment
+        :param row_group_size: 每个row group的行数
+        :param compression: 压缩算法
+    """
+    def __init__(self, file_path: str, type: str = 'note', row_group_size: int = 10000, compression: str = 'zstd'):
+        super().__init__(row_group_size, None)
+        pa = import_pyarrow()
+        self.pa = pa
+        self.file_path = file_path
+        self.columns = parquet_columns(type)
+        self.schema = parquet_schema(type)
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        self.part_path = file_path + '.part'
+        self.writer = pa.parquet.ParquetWriter(self.part_path, self.schema, compression=compression)
+
+    def write_batch(self, datas):
+        arrays = [self.pa.array(to_column([data.get(name) for data in datas], kind), type=field.type)
+                  for (name, kind), field in zip(self.columns, self.schema)]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema), row_group_size=self.batch_size)
+
+    def close(self):
+        super().close()
+        self.writer.close()
+        os.replace(self.part_path, self.file_path)
+
+    def abort(self):
+        self.writer.close()
+
+
+def save_to_parquet(datas, file_path, type='note', row_group_size=10000):
+    """
+        流式保存到parquet，datas 可以是列表也可以是生成器
+    """
+    with Parquet_Sink(file_path, type, row_group_size) as sink:
+        for data in datas:
+            sink.write(data)
+    return file_path
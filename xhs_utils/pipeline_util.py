@@ -0,0 +1,93 @@
+import queue
+import threading
+
+from loguru import logger
+
+# 结束标记，上一阶段的全部线程结束后给下一阶段的每个线程发一个
+_stop = object()
+
+
+class Pipeline_Stage():
+    """
+        流水线的一个阶段
+        :param name: 阶段名，用于日志和统计
+        :param fn: 处理函数 fn(item)，返回交给下一阶段的数据，返回None表示丢弃
+        :param workers: 这个阶段的线程数
+        :param queue_size: 这个阶段输入队列的长度，队列满时上一阶段阻塞等待
+    """
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = 16):
+        self.name = name
+        self.fn = fn
+        self.workers = max(workers, 1)
+        self.queue = queue.Queue(maxsize=max(queue_size, 1))
+        self.alive = 0
+        self.stats = {'in': 0, 'out': 0, 'drop': 0, 'error': 0}
+        self.lock = threading.Lock()
+
+
+class Pipeline():
+    """
+        生产者/消费者流水线，各阶段之间用有界队列连接，每个阶段有自己的线程数
+        各阶段同时运行，下游处理不过来时上游阻塞，整体速度取决于最慢的阶段
+        某条数据在某个阶段出错只记录日志并丢弃，不影响其它数据
+    """
+    def __init__(self):
+        self.stages = []
+
+    def add_stage(self, name: str, fn, workers: int = 1, queue_size: int = 16):
+        """
+            添加一个阶段，参数含义见 Pipeline_Stage
+            返回流水线本身，可以链式调用
+        """
+        self.stages.append(Pipeline_Stage(name, fn, workers, queue_size))
+        return self
+
+    def worker(self, index: int):
+        stage = self.stages[index]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        while True:
+            item = stage.queue.get()
+            if item is _stop:
+                with stage.lock:
+                    stage.alive -= 1
+                    last = stage.alive == 0
+                if last and next_stage is not None:
+                    for _ in range(next_stage.workers):
+                        next_stage.queue.put(_stop)
+                return
+            try:
+                out = stage.fn(item)
+            except Exception as e:
+                logger.error(f'流水线阶段 {stage.name} 处理失败: {e}')
+                with stage.lock:
+                    stage.stats['in'] += 1
+                    stage.stats['error'] += 1
+                continue
+            with stage.lock:
+                stage.stats['in'] += 1
+                stage.stats['drop' if out is None else 'out'] += 1
+            if out is not None and next_stage is not None:
+                next_stage.queue.put(out)
+
+    def run(self, items):
+        """
+            在当前线程把 items 逐个送入第一个阶段，等待全部阶段处理完成
+            返回各阶段的统计 {阶段名: {'in', 'out', 'drop', 'error'}}
+        """
+        threads = []
+        for index, stage in enumerate(self.stages):
+            stage.alive = stage.workers
+            for i in range(stage.workers):
+                thread = threading.Thread(target=self.worker, args=(index,), name=f'pipeline_{stage.name}_{i}', daemon=True)
+                thread.start()
+                threads.append(thread)
+        first = self.stages[0]
+        try:
+            for item in items:
+                first.queue.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.queue.put(_stop)
+        for thread in threads:
+            thread.join()
+        return {stage.name: dict(stage.stats) for stage in self.stages}
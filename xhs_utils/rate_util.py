@@ -0,0 +1,27 @@
+import threading
+import time
+
+
+class Rate_Limiter():
+    """
+        按key（如账号的a1）限制请求速率，线程安全
+        同一个key的相邻两次请求至少间隔 1 / rate 秒
+    """
+    def __init__(self):
+        self.next_time = {}
+        self.lock = threading.Lock()
+
+    def wait(self, key: str, rate: float = None):
+        """
+            等待直到key可以发起下一次请求
+            :param key: 限速的key
+            :param rate: 每秒最多请求数，为空不限速
+        """
+        if not rate:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time.get(key, now))
+            self.next_time[key] = start + 1 / rate
+        if start > now:
+            time.sleep(start - now)
@@ -0,0 +1,178 @@
+import atexit
+import collections
+import json
+import os
+import queue
+import subprocess
+import threading
+
+static_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../static'))
+worker_script = os.path.join(static_path, 'xhs_sign_worker.js')
+# v8编译缓存目录，worker重启时直接复用编译结果
+cache_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/js_cache'))
+
+
+def pump(stream, put):
+    """
+        在后台线程里逐行读取进程输出，读完时放入None
+    """
+    for line in iter(stream.readline, b''):
+        put(line)
+    put(None)
+
+
+class Sign_Worker():
+    """
+        常驻的node签名进程，脚本只加载一次，之后通过stdin/stdout按行收发json
+        stderr 保留最后几行，进程启动失败或退出时附在异常信息里
+        :param scripts: 需要加载的js脚本，相对static目录
+        :param node_path: node可执行文件
+        :param timeout: 启动和每次调用等待响应的秒数，超时结束进程并抛出异常，进程池会另外启动新进程
+    """
+    def __init__(self, scripts: list, node_path: str = 'node', timeout: float = 30):
+        env = dict(os.environ, XHS_JS_CACHE_DIR=cache_path)
+        self.process = subprocess.Popen(
+            [node_path, worker_script, *scripts],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            cwd=static_path,
+            env=env,
+        )
+        self.timeout = timeout
+        self.seq = 0
+        self.lines = queue.Queue()
+        self.stderr_lines = collections.deque(maxlen=20)
+        threading.Thread(target=pump, args=(self.process.stdout, self.lines.put), daemon=True).start()
+        self.stderr_thread = threading.Thread(target=pump, args=(self.process.stderr, self.stderr_lines.append), daemon=True)
+        self.stderr_thread.start()
+        ready = self._read()
+        if ready.get('result') != 'ready':
+            self.close()
+            raise Exception(f'签名进程启动失败: {ready.get("error")}')
+
+    def stderr(self):
+        """
+            返回进程stderr的最后几行
+        """
+        if not self.alive():
+            self.stderr_thread.join(timeout=1)
+        return b''.join(line for line in list(self.stderr_lines) if line is not None).decode('utf-8', errors='replace').strip()
+
+    def _read(self):
+        try:
+            line = self.lines.get(timeout=self.timeout)
+        except queue.Empty:
+            self.kill()
+            raise Exception(f'签名进程 {self.timeout} 秒没有响应，已结束进程')
+        if line is None:
+            self.process.wait()
+            raise Exception(f'签名进程已退出: {self.stderr()}')
+        return json.loads(line)
+
+    def call(self, method: str, *args):
+        self.seq += 1
+        line = json.dumps({'id': self.seq, 'method': method, 'args': args}, ensure_ascii=False)
+        self.process.stdin.write(line.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        ret = self._read()
+        if ret.get('id') != self.seq:
+            self.close()
+            raise Exception(f'签名进程响应错乱: {ret}')
+        if 'error' in ret:
+            raise Exception(ret['error'])
+        return ret.get('result')
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def kill(self):
+        self.process.kill()
+        self.process.wait()
+
+    def close(self):
+        if self.alive():
+            try:
+                self.process.stdin.close()
+                self.process.wait(timeout=3)
+            except Exception:
+                self.process.kill()
+
+
+class Sign_Worker_Pool():
+    """
+        node签名进程池，进程按需启动，线程安全
+        :param scripts: 需要加载的js脚本，相对static目录
+        :param size: 最多启动的进程数
+        :param node_path: node可执行文件
+        :param timeout: 等待进程响应的秒数，超时的进程被结束，下次调用时启动新进程替换
+    """
+    def __init__(self, scripts: list, size: int = 4, node_path: str = 'node', timeout: float = 30):
+        self.scripts = scripts
+        self.size = size
+        self.node_path = node_path
+        self.timeout = timeout
+        self.idle = queue.LifoQueue()
+        self.workers = []
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+
+    def warmup(self, size: int = None):
+        """
+            预先启动进程，避免第一次签名时等待node启动
+            :param size: 预先启动的进程数，默认启动全部进程
+        """
+        size = self.size if size is None else min(size, self.size)
+        with self.lock:
+            while len(self.workers) < size:
+                worker = Sign_Worker(self.scripts, self.node_path, self.timeout)
+                self.workers.append(worker)
+                self.idle.put(worker)
+
+    def _acquire(self):
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    if len(self.workers) < self.size:
+                        worker = Sign_Worker(self.scripts, self.node_path, self.timeout)
+                        self.workers.append(worker)
+                        return worker
+                worker = self.idle.get()
+            # None 表示有进程被丢弃，空出的名额可以重新启动进程
+            if worker is not None:
+                return worker
+
+    def _release(self, worker):
+        if worker.alive():
+            self.idle.put(worker)
+            return
+        worker.close()
+        with self.lock:
+            if worker in self.workers:
+                self.workers.remove(worker)
+        self.idle.put(None)
+
+    def call(self, method: str, *args):
+        worker = self._acquire()
+        try:
+            return worker.call(method, *args)
+        finally:
+            self._release(worker)
+
+    def call_batch(self, calls: list):
+        """
+            在同一个进程里一次完成多次调用
+            :param calls: [(method, args), ...]
+            返回每次调用的结果列表
+        """
+        return self.call('batch', [[method, list(args)] for method, args in calls])
+
+    def close(self):
+        with self.lock:
+            workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.close()
+        while not self.idle.empty():
+            self.idle.get_nowait()
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+
+import execjs
+
+from xhs_utils.sign_worker import Sign_Worker_Pool, static_path
+from xhs_utils.xhs_creator_util import get_request_headers_params
+
+
+class Signer():
+    """
+        签名后端的基类，sign 返回 (xs, xt, xs_common)，不需要 xs_common 的接口返回空字符串
+    """
+    def sign(self, a1, api, data='', method='POST'):
+        raise NotImplementedError
+
+    def sign_batch(self, requests, a1):
+        """
+            批量签名
+            :param requests: [(api, data, method), ...]
+            :param a1: cookies中的a1
+            返回 [(xs, xt, xs_common), ...]，与requests顺序一致
+        """
+        return [self.sign(a1, api, data, method) for api, data, method in requests]
+
+    def warmup(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class Execjs_Signer(Signer):
+    """
+        通过execjs逐次调用签名脚本，外部node运行时每次调用都会启动一个进程
+        :param script: static目录下的签名脚本
+    """
+    def __init__(self, script: str = 'xhs_xs_xsc_56.js'):
+        self.script = script
+        self.js = None
+
+    def warmup(self):
+        if self.js is None:
+            with open(os.path.join(static_path, self.script), 'r', encoding='utf-8') as f:
+                self.js = execjs.compile(f.read(), cwd=static_path)
+
+    def sign(self, a1, api, data='', method='POST'):
+        self.warmup()
+        ret = self.js.call('get_request_headers_params', api, data, a1, method)
+        return ret['xs'], ret['xt'], ret.get('xs_common', '')
+
+
+class Node_Pool_Signer(Signer):
+    """
+        通过常驻的node进程池签名，脚本只加载一次
+        :param script: static目录下的签名脚本
+        :param size: 最多启动的进程数
+        :param node_path: node可执行文件
+        :param timeout: 等待签名进程响应的秒数，超时的进程会被结束并替换
+    """
+    def __init__(self, script: str = 'xhs_xs_xsc_56.js', size: int = 4, node_path: str = 'node', timeout: float = 30):
+        self.pool = Sign_Worker_Pool([script], size, node_path, timeout)
+
+    def sign(self, a1, api, data='', method='POST'):
+        ret = self.pool.call('get_request_headers_params', api, data, a1, method)
+        return ret['xs'], ret['xt'], ret.get('xs_common', '')
+
+    def sign_batch(self, requests, a1):
+        if not requests:
+            return []
+        calls = [('get_request_headers_params', (api, data, a1, method)) for api, data, method in requests]
+        rets = self.pool.call_batch(calls)
+        return [(ret['xs'], ret['xt'], ret.get('xs_common', '')) for ret in rets]
+
+    def warmup(self, size: int = None):
+        self.pool.warmup(size)
+
+    def close(self):
+        self.pool.close()
+
+
+class Creator_Python_Signer(Signer):
+    """
+        纯python实现的创作者中心签名，不依赖node
+    """
+    def sign(self, a1, api, data='', method='POST'):
+        ret = get_request_headers_params(api, data, a1)
+        return ret['xs'], ret['xt'], ''
+
+
+class Fake_Signer(Signer):
+    """
+        确定性的假签名，相同的输入得到相同的输出，用于离线测试、mock服务和基准测试
+        :param xt: 固定返回的时间戳
+    """
+    def __init__(self, xt: int = 1700000000000):
+        self.xt = xt
+
+    def sign(self, a1, api, data='', method='POST'):
+        if data:
+            data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        digest = hashlib.md5(f'{method}{api}{data}{a1}'.encode('utf-8')).hexdigest()
+        return f'XYS_fake_{digest}', self.xt, f'fake_{digest}'
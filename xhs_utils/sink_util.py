@@ -0,0 +1,241 @@
+import csv
+import json
+import os
+
+from xhs_utils.xlsx_util import EXCEL_MAX_ROWS, Xlsx_Writer, xlsx_headers, xlsx_row
+
+
+def repair_tail(file_path: str):
+    """
+        去掉上次崩溃时写了一半的最后一行，之后可以直接追加
+    """
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, mode='rb+') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+        pos = size
+        while pos > 0:
+            step = min(64 * 1024, pos)
+            pos -= step
+            f.seek(pos)
+            index = f.read(step).rfind(b'\n')
+            if index != -1:
+                f.truncate(pos + index + 1)
+                return
+        f.truncate(0)
+
+
+def repair_csv_tail(file_path: str):
+    """
+        去掉上次崩溃时写了一半的最后一条csv记录
+        带换行的字段在引号里，一条记录可能跨多行，只有引号配对完整的换行才是记录的结尾
+    """
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, mode='rb+') as f:
+        quoted = False
+        pos = 0
+        end = 0
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                break
+            lines = block.split(b'\n')
+            for line in lines[:-1]:
+                quoted ^= line.count(b'"') % 2 == 1
+                pos += len(line) + 1
+                if not quoted:
+                    end = pos
+            quoted ^= lines[-1].count(b'"') % 2 == 1
+            pos += len(lines[-1])
+        if end != pos:
+            f.truncate(end)
+
+
+class Sink():
+    """
+        结果输出的基类，数据边产生边写入
+        write 的数据先攒在缓冲区，每 batch_size 条写入文件一次，每 checkpoint_size 条调用一次fsync落盘
+        :param batch_size: 每批写入的条数
+        :param checkpoint_size: 每多少条fsync一次，为空时只在close时fsync
+    """
+    def __init__(self, batch_size: int = 100, checkpoint_size: int = 1000):
+        self.batch_size = max(batch_size, 1)
+        self.checkpoint_size = checkpoint_size
+        self.buffer = []
+        self.rows = 0
+        self.synced_rows = 0
+
+    def write(self, data: dict):
+        self.buffer.append(data)
+        self.rows += 1
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        if self.checkpoint_size and self.rows - self.synced_rows >= self.checkpoint_size:
+            self.checkpoint()
+
+    def write_batch(self, datas):
+        raise NotImplementedError
+
+    def flush(self):
+        if self.buffer:
+            self.write_batch(self.buffer)
+            self.buffer = []
+
+    def sync(self):
+        pass
+
+    def checkpoint(self):
+        self.flush()
+        self.sync()
+        self.synced_rows = self.rows
+
+    def close(self):
+        self.checkpoint()
+
+    def abort(self):
+        """
+            出错退出时调用，默认和close一样保存已经写入的数据
+        """
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class File_Sink(Sink):
+    """
+        追加写入的文本文件，打开时先修复上次崩溃留下的半行
+    """
+    def __init__(self, file_path: str, batch_size: int = 100, checkpoint_size: int = 1000, encoding: str = 'utf-8'):
+        super().__init__(batch_size, checkpoint_size)
+        self.file_path = file_path
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        self.repair()
+        self.is_new = not os.path.exists(file_path) or os.path.getsize(file_path) == 0
+        self.f = open(file_path, mode='a', encoding=encoding, newline='')
+
+    def repair(self):
+        repair_tail(self.file_path)
+
+    def sync(self):
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self):
+        super().close()
+        self.f.close()
+
+
+class Jsonl_Sink(File_Sink):
+    """
+        每条数据一行json
+        :param file_path: 保存路径，已存在时追加
+    """
+    def write_batch(self, datas):
+        self.f.write(''.join(json.dumps(data, ensure_ascii=False) + '\n' for data in datas))
+        self.f.flush()
+
+    @staticmethod
+    def load_keys(file_path: str, key: str = 'note_id'):
+        """
+            读取已经写入的数据的key，用于断点续爬时跳过已完成的数据，忽略写了一半的最后一行
+            返回key的集合
+        """
+        keys = set()
+        if not os.path.exists(file_path):
+            return keys
+        with open(file_path, mode='r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    keys.add(json.loads(line)[key])
+                except (ValueError, KeyError):
+                    continue
+        return keys
+
+
+class Csv_Sink(File_Sink):
+    """
+        与excel相同列的csv，新文件带BOM和表头，excel可以直接打开
+        描述等字段里的换行原样保留在引号里，打开时按引号配对修复写了一半的记录
+        :param file_path: 保存路径，已存在时追加
+        :param type: note / user / comment
+        :param search_query: 笔记的搜索词列
+    """
+    def __init__(self, file_path: str, type: str = 'note', search_query: str = '', batch_size: int = 100, checkpoint_size: int = 1000):
+        super().__init__(file_path, batch_size, checkpoint_size)
+        self.type = type
+        self.search_query = search_query
+        self.writer = csv.writer(self.f)
+        if self.is_new:
+            self.f.write('\ufeff')
+            self.writer.writerow(xlsx_headers(type))
+            self.f.flush()
+
+    def repair(self):
+        repair_csv_tail(self.file_path)
+
+    def write_batch(self, datas):
+        self.writer.writerows(xlsx_row(data, self.type, self.search_query) for data in datas)
+        self.f.flush()
+
+
+class Xlsx_Sink(Sink):
+    """
+        excel输出，行数据流式写入临时文件，close时才生成完整的xlsx
+        :param file_path: 保存路径，已存在时覆盖
+        :param type: note / user / comment
+        :param search_query: 笔记的搜索词列
+        :param max_rows: 每个sheet最多的数据行数
+        :param split: 超出行数时新建 sheet 还是 file
+    """
+    def __init__(self, file_path: str, type: str = 'note', search_query: str = '', max_rows: int = EXCEL_MAX_ROWS - 1, split: str = 'sheet', batch_size: int = 100):
+        super().__init__(batch_size, None)
+        self.type = type
+        self.search_query = search_query
+        self.writer = Xlsx_Writer(file_path, xlsx_headers(type), max_rows, split)
+
+    def write_batch(self, datas):
+        for data in datas:
+            self.writer.append(xlsx_row(data, self.type, self.search_query))
+
+    def close(self):
+        super().close()
+        self.writer.close()
+
+
+class Multi_Sink(Sink):
+    """
+        同时写入多个输出
+    """
+    def __init__(self, sinks: list):
+        super().__init__(1, None)
+        self.sinks = sinks
+
+    def write(self, data: dict):
+        for sink in self.sinks:
+            sink.write(data)
+
+    def checkpoint(self):
+        for sink in self.sinks:
+            sink.checkpoint()
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+    def abort(self):
+        for sink in self.sinks:
+            sink.abort()
@@ -0,0 +1,184 @@
+import json
+import os
+import sqlite3
+import threading
+
+from xhs_utils.data_util import parse_number
+from xhs_utils.sink_util import Sink
+from xhs_utils.xlsx_util import note_headers, user_headers, comment_headers
+
+sqlite_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/xhs.db'))
+
+# 列名和sqlite类型，list 类型的列以json字符串保存，INTEGER 类型的列把 '1.1万' 这样的字符串转成整数
+note_columns = [
+    ('note_id', 'TEXT PRIMARY KEY'), ('note_url', 'TEXT'), ('note_type', 'TEXT'), ('user_id', 'TEXT'), ('home_url', 'TEXT'),
+    ('nickname', 'TEXT'), ('avatar', 'TEXT'), ('title', 'TEXT'), ('desc', 'TEXT'),
+    ('liked_count', 'INTEGER'), ('collected_count', 'INTEGER'), ('comment_count', 'INTEGER'), ('share_count', 'INTEGER'),
+    ('video_cover', 'TEXT'), ('video_addr', 'TEXT'), ('image_list', 'list'), ('tags', 'list'),
+    ('upload_time', 'TEXT'), ('ip_location', 'TEXT'), ('search_query', 'TEXT'),
+]
+user_columns = [
+    ('user_id', 'TEXT PRIMARY KEY'), ('home_url', 'TEXT'), ('nickname', 'TEXT'), ('avatar', 'TEXT'), ('red_id', 'TEXT'),
+    ('gender', 'TEXT'), ('ip_location', 'TEXT'), ('desc', 'TEXT'),
+    ('follows', 'INTEGER'), ('fans', 'INTEGER'), ('interaction', 'INTEGER'), ('tags', 'list'),
+]
+comment_columns = [
+    ('comment_id', 'TEXT PRIMARY KEY'), ('note_id', 'TEXT'), ('note_url', 'TEXT'), ('user_id', 'TEXT'), ('home_url', 'TEXT'),
+    ('nickname', 'TEXT'), ('avatar', 'TEXT'), ('content', 'TEXT'), ('show_tags', 'list'),
+    ('like_count', 'INTEGER'), ('upload_time', 'TEXT'), ('ip_location', 'TEXT'), ('pictures', 'list'),
+]
+media_columns = [
+    ('note_id', 'TEXT NOT NULL'), ('name', 'TEXT NOT NULL'), ('url', 'TEXT'), ('url_key', 'TEXT'), ('path', 'TEXT'), ('size', 'INTEGER'),
+]
+tables = {
+    'notes': (note_columns, ['note_id']),
+    'users': (user_columns, ['user_id']),
+    'comments': (comment_columns, ['comment_id']),
+    'media': (media_columns, ['note_id', 'name']),
+}
+indexes = [
+    ('notes', 'user_id'), ('notes', 'upload_time'),
+    ('comments', 'note_id'), ('comments', 'user_id'), ('comments', 'upload_time'),
+]
+# 导出视图，列顺序和表头与 save_to_xlsx 一致
+export_views = {
+    'note_export': ('notes', ['search_query', 'title', 'desc', 'tags', 'liked_count', 'collected_count', 'comment_count', 'share_count', 'note_url', 'note_id', 'user_id', 'home_url', 'nickname', 'avatar', 'image_list', 'video_cover', 'video_addr', 'upload_time', 'ip_location'], note_headers),
+    'user_export': ('users', [name for name, kind in user_columns], user_headers),
+    'comment_export': ('comments', ['note_id', 'note_url', 'comment_id', 'user_id', 'home_url', 'nickname', 'avatar', 'content', 'show_tags', 'like_count', 'upload_time', 'ip_location', 'pictures'], comment_headers),
+}
+
+
+class Sqlite_Store():
+    """
+        笔记、用户、评论和媒体的sqlite存储，线程安全
+        使用WAL模式，按主键批量upsert，重复爬取的数据覆盖为最新值，跨多次运行去重和关联都是带索引的查询
+        :param path: sqlite文件路径，默认 datas/xhs.db
+    """
+    def __init__(self, path: str = sqlite_path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        with self.conn:
+            for table, (columns, keys) in tables.items():
+                defs = ', '.join(f'"{name}" {"TEXT" if kind == "list" else kind}' for name, kind in columns)
+                if len(keys) > 1:
+                    defs += f', PRIMARY KEY ({", ".join(keys)})'
+                self.conn.execute(f'CREATE TABLE IF NOT EXISTS {table} ({defs})')
+            for table, column in indexes:
+                self.conn.execute(f'CREATE INDEX IF NOT EXISTS idx_{table}_{column} ON {table} ({column})')
+            for view, (table, names, headers) in export_views.items():
+                select = ', '.join(f'"{name}" AS "{header}"' for name, header in zip(names, headers))
+                self.conn.execute(f'CREATE VIEW IF NOT EXISTS {view} AS SELECT {select} FROM {table}')
+
+    def upsert(self, table: str, datas: list):
+        """
+            按主键批量插入或更新，一批在一个事务里提交
+            :param table: notes / users / comments / media
+            :param datas: 字典列表，缺少的列写入NULL，list类型的列保存为json，INTEGER类型的列用 parse_number 转成整数
+        """
+        columns, keys = tables[table]
+        names = [name for name, kind in columns]
+        kinds = [kind for name, kind in columns]
+        quoted = ', '.join(f'"{name}"' for name in names)
+        # 搜索词为空时保留之前保存的搜索词
+        updates = ', '.join(f'"{name}" = COALESCE(NULLIF(excluded."{name}", \'\'), {table}."{name}")' if name == 'search_query' else f'"{name}" = excluded."{name}"'
+                            for name in names if name not in keys)
+        sql = f'INSERT INTO {table} ({quoted}) VALUES ({", ".join("?" * len(names))}) ON CONFLICT ({", ".join(keys)}) DO UPDATE SET {updates}'
+        rows = []
+        for data in datas:
+            row = []
+            for name, kind in zip(names, kinds):
+                value = data.get(name)
+                if kind == 'list' and value is not None:
+                    value = json.dumps(value, ensure_ascii=False)
+                elif kind == 'INTEGER' and value is not None:
+                    value = parse_number(value)
+                row.append(value)
+            rows.append(row)
+        with self.lock, self.conn:
+            self.conn.executemany(sql, rows)
+
+    def upsert_notes(self, notes: list, search_query: str = ''):
+        """
+            :param search_query: 搜索词，为空时保留已保存的搜索词
+        """
+        if search_query:
+            notes = [dict(note, search_query=search_query) for note in notes]
+        self.upsert('notes', notes)
+
+    def upsert_users(self, users: list):
+        self.upsert('users', users)
+
+    def upsert_comments(self, comments: list):
+        self.upsert('comments', comments)
+
+    def upsert_media(self, medias: list):
+        """
+            已下载的媒体清单 Media_Manifest 也记录在这张表里
+            :param medias: [{'note_id', 'name', 'url', 'url_key', 'path', 'size'}, ...]
+        """
+        self.upsert('media', medias)
+
+    def query(self, sql: str, params: tuple = ()):
+        """
+            执行查询，返回全部结果行
+        """
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get(self, table: str, key: str):
+        """
+            按主键获取一条笔记、用户或评论，list类型的列解析回列表
+            返回字典，不存在返回None
+        """
+        columns, keys = tables[table]
+        with self.lock:
+            cursor = self.conn.execute(f'SELECT * FROM {table} WHERE {keys[0]} = ?', (key,))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        data = {}
+        for (name, kind), value in zip(columns, row):
+            data[name] = json.loads(value) if kind == 'list' and value is not None else value
+        return data
+
+    def export(self, view: str = 'note_export'):
+        """
+            按 save_to_xlsx 的列顺序导出
+            返回 (表头, 数据行列表)
+        """
+        with self.lock:
+            cursor = self.conn.execute(f'SELECT * FROM {view}')
+            headers = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        return headers, rows
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class Sqlite_Sink(Sink):
+    """
+        把结果批量upsert到 Sqlite_Store，可以作为 spider_some_note_pipeline 的 sinks 使用
+        :param store: Sqlite_Store
+        :param type: note / user / comment
+        :param search_query: 笔记的搜索词
+        :param batch_size: 每批upsert的条数
+    """
+    def __init__(self, store: Sqlite_Store, type: str = 'note', search_query: str = '', batch_size: int = 500):
+        super().__init__(batch_size, None)
+        self.store = store
+        self.type = type
+        self.search_query = search_query
+
+    def write_batch(self, datas):
+        if self.type == 'note':
+            self.store.upsert_notes(datas, self.search_query)
+        elif self.type == 'user':
+            self.store.upsert_users(datas)
+        else:
+            self.store.upsert_comments(datas)
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import threading
+
+watermark_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../datas/watermark.db'))
+
+
+class Watermark_Store():
+    """
+        增量同步的水位线，保存在本地sqlite，线程安全
+        每个 (scope, key) 记录已经见过的最新一条数据的时间和id，比如 ('note_comment', 笔记id)
+        :param path: sqlite文件路径，默认 datas/watermark.db
+    """
+    def __init__(self, path: str = watermark_path):
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS watermark (
+                scope TEXT NOT NULL,
+                key TEXT NOT NULL,
+                time INTEGER NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (scope, key)
+            )
+        ''')
+        self.conn.commit()
+
+    def get(self, scope: str, key: str):
+        """
+            获取水位线
+            返回 {'time': 时间, 'id': id}，没有同步过返回None
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT time, id FROM watermark WHERE scope = ? AND key = ?', (scope, key)).fetchone()
+        if row is None:
+            return None
+        return {'time': row[0], 'id': row[1]}
+
+    def update(self, scope: str, key: str, time: int, id: str):
+        """
+            推进水位线，只有不早于已保存的时间才写入，避免乱序的结果让水位线倒退
+            同一时间的新数据会把id更新为其中最新的一条
+        """
+        with self.lock:
+            self.conn.execute('''
+                INSERT INTO watermark (scope, key, time, id) VALUES (?, ?, ?, ?)
+                ON CONFLICT (scope, key) DO UPDATE SET time = excluded.time, id = excluded.id
+                WHERE excluded.time >= watermark.time
+            ''', (scope, key, int(time), str(id)))
+            self.conn.commit()
+
+    def delete(self, scope: str, key: str):
+        """
+            删除水位线，下次同步重新全量获取
+        """
+        with self.lock:
+            self.conn.execute('DELETE FROM watermark WHERE scope = ? AND key = ?', (scope, key))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -1,15 +1,50 @@
+import base64
+import hashlib
 import json
+import time
 
-import execjs
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
 
-try:
-    js = execjs.compile(open(r'../static/xhs_creator_xs.js', 'r', encoding='utf-8').read())
-except:
-    js = execjs.compile(open(r'static/xhs_creator_xs.js', 'r', encoding='utf-8').read())
+# 与 static/xhs_creator_xs.js 相同的 aes-128-cbc 密钥
+creator_key = b'7cc4adla5ay0701v'
+creator_iv = b'4uzjr7mbsibcaldp'
+
+
+def get_request_headers_params(api, data, a1):
+    """
+        纯python实现的创作者中心签名，与 static/xhs_creator_xs.js 的 get_request_headers_params 结果一致
+        :param api: 请求的api（含query参数）
+        :param data: 请求体，GET请求为空字符串
+        :param a1: cookies中的a1
+        返回 {'xs': xs, 'xt': xt}
+    """
+    api = 'url=' + api
+    # js中空字典也为真，需要拼接 '{}'
+    if data or isinstance(data, (dict, list)):
+        api += json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+    x1 = hashlib.md5(api.encode('utf-8')).hexdigest()
+    x2 = '0|0|0|1|0|0|1|0|0|0|1|0|0|0|0|1|0|0|0'
+    x4 = int(time.time() * 1000)
+    x = f'x1={x1};x2={x2};x3={a1};x4={x4};'
+    cipher = AES.new(creator_key, AES.MODE_CBC, creator_iv)
+    payload = cipher.encrypt(pad(base64.b64encode(x.encode('latin-1')), AES.block_size)).hex()
+    encrypt_data = json.dumps({
+        "signSvn": "56",
+        "signType": "x2",
+        "appId": "ugc",
+        "signVersion": "1",
+        "payload": payload
+    }, separators=(',', ':'))
+    xs = 'XYW_' + base64.b64encode(encrypt_data.encode('utf-8')).decode('utf-8')
+    return {
+        'xs': xs,
+        'xt': x4,
+    }
 
 
 def generate_xs(a1, api, data=''):
-    ret = js.call('get_request_headers_params', api, data, a1)
+    ret = get_request_headers_params(api, data, a1)
     xs, xt = ret['xs'], ret['xt']
     if data:
         data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
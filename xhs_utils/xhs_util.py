@@ -1,18 +1,38 @@
 import json
 import math
+import os
 import random
+import threading
+import time
 import execjs
 from xhs_utils.cookie_util import trans_cookies
+from xhs_utils.signer import Node_Pool_Signer
 
-try:
-    js = execjs.compile(open(r'../static/xhs_xs_xsc_56.js', 'r', encoding='utf-8').read())
-except:
-    js = execjs.compile(open(r'static/xhs_xs_xsc_56.js', 'r', encoding='utf-8').read())
+# js在第一次使用时才编译，导入本模块不再加载签名脚本
+js = None
 
-try:
-    xray_js = execjs.compile(open(r'../static/xhs_xray.js', 'r', encoding='utf-8').read())
-except:
-    xray_js = execjs.compile(open(r'static/xhs_xray.js', 'r', encoding='utf-8').read())
+# 默认的签名后端：常驻的node签名进程池，避免每次签名都重新启动node并加载脚本，进程在第一次签名时才启动
+default_signer = Node_Pool_Signer('xhs_xs_xsc_56.js')
+
+# 与 static/xhs_xray.js 中 traceId 相同的序号：初始为随机23位，超过上限归零
+xray_max_seq = 2 ** 23 - 1
+xray_seq = random.getrandbits(23)
+xray_lock = threading.Lock()
+
+def load_js():
+    global js
+    if js is None:
+        js_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../static/xhs_xs_xsc_56.js'))
+        with open(js_path, 'r', encoding='utf-8') as f:
+            js = execjs.compile(f.read())
+    return js
+
+def warmup(size=None):
+    """
+        预热签名进程池，提前启动node并加载签名脚本
+        :param size: 预先启动的进程数，默认启动进程池的全部进程
+    """
+    default_signer.warmup(size)
 
 def generate_x_b3_traceid(len=16):
     x_b3_traceid = ""
@@ -20,18 +40,41 @@ def generate_x_b3_traceid(len=16):
         x_b3_traceid += "abcdef0123456789"[math.floor(16 * random.random())]
     return x_b3_traceid
 
-def generate_xs_xs_common(a1, api, data='', method='POST'):
-    ret = js.call('get_request_headers_params', api, data, a1, method)
-    xs, xt, xs_common = ret['xs'], ret['xt'], ret['xs_common']
+def generate_xs_xs_common(a1, api, data='', method='POST', signer=None):
+    signer = signer or default_signer
+    xs, xt, xs_common = signer.sign(a1, api, data, method)
     return xs, xt, xs_common
 
+def sign_batch(requests, a1, signer=None):
+    """
+        批量签名，一次进程往返完成多个请求的签名
+        :param requests: [(api, data, method), ...]
+        :param a1: cookies中的a1
+        :param signer: 签名后端，默认为常驻node进程池
+        返回 [(xs, xt, xs_common), ...]，与requests顺序一致
+    """
+    signer = signer or default_signer
+    return signer.sign_batch(requests, a1)
+
 def generate_xs(a1, api, data=''):
-    ret = js.call('get_xs', api, data, a1)
+    ret = load_js().call('get_xs', api, data, a1)
     xs, xt = ret['X-s'], ret['X-t']
     return xs, xt
 
 def generate_xray_traceid():
-    return xray_js.call('traceId')
+    """
+        纯python实现的x-xray-traceid，格式与xray的traceId一致
+        前16位为 (毫秒时间戳 << 23 | 序号)，后16位为64位随机数，均为16进制
+    """
+    global xray_seq
+    with xray_lock:
+        if xray_seq > xray_max_seq:
+            xray_seq = 0
+        seq = xray_seq
+        xray_seq += 1
+    head = ((int(time.time() * 1000) << 23) | seq) & 0xFFFFFFFFFFFFFFFF
+    return '%016x%016x' % (head, random.getrandbits(64))
+
 def get_common_headers():
     return {
         "authority": "www.xiaohongshu.com",
@@ -75,8 +118,8 @@ def get_request_headers_template():
         "x-xray-traceid": generate_xray_traceid()
     }
 
-def generate_headers(a1, api, data='', method='POST'):
-    xs, xt, xs_common = generate_xs_xs_common(a1, api, data, method)
+def generate_headers(a1, api, data='', method='POST', signer=None):
+    xs, xt, xs_common = generate_xs_xs_common(a1, api, data, method, signer)
     x_b3_traceid = generate_x_b3_traceid()
     headers = get_request_headers_template()
     headers['x-s'] = xs
@@ -87,12 +130,34 @@ def generate_headers(a1, api, data='', method='POST'):
         data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
     return headers, data
 
-def generate_request_params(cookies_str, api, data='', method='POST'):
+def generate_request_params(cookies_str, api, data='', method='POST', signer=None):
     cookies = trans_cookies(cookies_str)
     a1 = cookies['a1']
-    headers, data = generate_headers(a1, api, data, method)
+    headers, data = generate_headers(a1, api, data, method, signer)
     return headers, cookies, data
 
+def generate_request_params_batch(cookies_str, requests, signer=None):
+    """
+        批量生成请求参数，适合预先规划好的一批请求（如多页搜索）
+        :param cookies_str: 你的cookies
+        :param requests: [(api, data, method), ...]
+        :param signer: 签名后端，默认为常驻node进程池
+        返回 [(headers, cookies, data), ...]，与requests顺序一致
+    """
+    cookies = trans_cookies(cookies_str)
+    a1 = cookies['a1']
+    params = []
+    for (api, data, method), (xs, xt, xs_common) in zip(requests, sign_batch(requests, a1, signer)):
+        headers = get_request_headers_template()
+        headers['x-s'] = xs
+        headers['x-t'] = str(xt)
+        headers['x-s-common'] = xs_common
+        headers['x-b3-traceid'] = generate_x_b3_traceid()
+        if data:
+            data = json.dumps(data, separators=(',', ':'), ensure_ascii=False)
+        params.append((headers, cookies, data))
+    return params
+
 def splice_str(api, params):
     url = api + '?'
     for key, value in params.items():
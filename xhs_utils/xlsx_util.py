@@ -0,0 +1,112 @@
+import os
+import re
+
+import openpyxl
+from loguru import logger
+
+# excel不允许的控制字符，预先编译避免每个单元格都重新查正则缓存
+ILLEGAL_CHARACTERS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+# excel每个sheet最多的行数，包含表头
+EXCEL_MAX_ROWS = 1048576
+
+note_headers = ['搜索词', '标题', '描述', '标签', '点赞数量', '收藏数量', '评论数量', '分享数量', '笔记url', '笔记id', '用户id', '用户主页url', '昵称', '头像url', '图片地址url列表', '视频封面url', '视频地址url', '上传时间', 'ip归属地']
+user_headers = ['用户id', '用户主页url', '用户名', '头像url', '小红书号', '性别', 'ip地址', '介绍', '关注数量', '粉丝数量', '作品被赞和收藏数量', '标签']
+comment_headers = ['笔记id', '笔记url', '评论id', '用户id', '用户主页url', '昵称', '头像url', '评论内容', '评论标签', '点赞数量', '上传时间', 'ip归属地', '图片地址url列表']
+# 笔记的列顺序：搜索词, 标题, 描述, 标签, 点赞数量, 收藏数量, 评论数量, 分享数量, 笔记url, 笔记id, 用户id, 用户主页url, 昵称, 头像url, 图片地址url列表, 视频封面url, 视频地址url, 上传时间, ip归属地
+note_keys = [('title', ''), ('desc', ''), ('tags', []), ('liked_count', 0), ('collected_count', 0), ('comment_count', 0), ('share_count', 0), ('note_url', ''), ('note_id', ''), ('user_id', ''), ('home_url', ''), ('nickname', ''), ('avatar', ''), ('image_list', []), ('video_cover', ''), ('video_addr', ''), ('upload_time', ''), ('ip_location', '')]
+
+
+def norm_text(text):
+    return ILLEGAL_CHARACTERS_RE.sub('', text)
+
+
+def xlsx_headers(type='note'):
+    if type == 'note':
+        return note_headers
+    elif type == 'user':
+        return user_headers
+    return comment_headers
+
+
+def xlsx_row(data, type='note', search_query=''):
+    """
+        把一条笔记、用户或评论转换成excel的一行，所有值都转成去掉非法字符的字符串
+    """
+    if type == 'note':
+        return [search_query] + [norm_text(str(data.get(key, default))) for key, default in note_keys]
+    return [norm_text(str(v)) for v in data.values()]
+
+
+class Xlsx_Writer():
+    """
+        基于openpyxl只写模式的流式excel导出，每行写入后不再保存在内存里，内存占用不随行数增长
+        超过excel的行数上限时自动换到新的sheet或新的文件，每个sheet或文件都会重新写表头
+        :param file_path: 保存路径，分文件时后续文件为 name_2.xlsx, name_3.xlsx ...
+        :param headers: 表头
+        :param max_rows: 每个sheet最多的数据行数，默认为excel上限减去表头
+        :param split: 'sheet' 超出时新建sheet，'file' 超出时新建文件
+    """
+    def __init__(self, file_path: str, headers: list, max_rows: int = EXCEL_MAX_ROWS - 1, split: str = 'sheet'):
+        if split not in ('sheet', 'file'):
+            raise ValueError(f'split 只能是 sheet 或 file: {split}')
+        self.file_path = file_path
+        self.headers = headers
+        self.max_rows = max_rows
+        self.split = split
+        self.file_paths = []
+        self.wb = None
+        self.ws = None
+        self.sheet_rows = 0
+        self.sheet_count = 0
+        self.rows = 0
+
+    def new_workbook(self):
+        self.wb = openpyxl.Workbook(write_only=True)
+        self.sheet_count = 0
+        if not self.file_paths:
+            self.file_paths.append(self.file_path)
+        else:
+            name, ext = os.path.splitext(self.file_path)
+            self.file_paths.append(f'{name}_{len(self.file_paths) + 1}{ext}')
+
+    def new_sheet(self):
+        self.sheet_count += 1
+        self.ws = self.wb.create_sheet('Sheet' if self.sheet_count == 1 else f'Sheet{self.sheet_count}')
+        self.ws.append(self.headers)
+        self.sheet_rows = 0
+
+    def append(self, row: list):
+        if self.wb is None:
+            self.new_workbook()
+            self.new_sheet()
+        elif self.sheet_rows >= self.max_rows:
+            if self.split == 'file':
+                self.save()
+                self.new_workbook()
+            self.new_sheet()
+        self.ws.append(row)
+        self.sheet_rows += 1
+        self.rows += 1
+
+    def save(self):
+        self.wb.save(self.file_paths[-1])
+        self.wb = None
+        logger.info(f'数据保存至 {self.file_paths[-1]}')
+
+    def close(self):
+        """
+            保存还没写完的文件，没有数据时只写表头
+            返回写入的全部文件路径
+        """
+        if self.wb is None and not self.file_paths:
+            self.new_workbook()
+            self.new_sheet()
+        if self.wb is not None:
+            self.save()
+        return self.file_paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()